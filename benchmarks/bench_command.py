@@ -0,0 +1,95 @@
+"""
+Time `manage.py hostfile` end to end, the way CI and hooks run it.
+
+Run from the repository root, for example:
+
+    uv run python benchmarks/bench_command.py --sizes 10000 500000
+
+Each case calls the command in-process with `--file` pointing at a
+generated hostfile, with this project's hostname on its fourth line,
+as it usually is. That covers loading (from the cache or not), the
+membership check and the warnings, which is where a new index built
+for every run shows up. Django's own start-up isn't included.
+"""
+import argparse
+import io
+import json
+import os
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+
+from bench_hostfile import best_of
+from hostfile_data import generate
+from runserveronhostname.hostfile_cache import cache_dir
+
+
+HOSTNAME = 'testproject.localhost'
+
+
+def hostfile_text(lines: int) -> str:
+    "A generated hostfile with this project's hostname near the top."
+    generated = generate(lines - 1).splitlines(keepends=True)
+    return ''.join(generated[:3] + [f"127.0.0.1\t{HOSTNAME}\n"] + generated[3:])
+
+
+def cases(path: Path):
+    "Yield (case name, setup, extra arguments)."
+    def clear_cache():
+        shutil.rmtree(cache_dir(), ignore_errors=True)
+
+    def warm_cache():
+        call_command('hostfile', '--file', str(path), stdout=io.StringIO(), stderr=io.StringIO())
+
+    yield 'cache_miss', clear_cache, []
+    yield 'cache_hit', warm_cache, []
+    yield 'no_cache', clear_cache, ['--no-cache']
+    yield 'conflicts', warm_cache, ['--conflicts']
+    yield 'low_memory', clear_cache, ['--low-memory']
+
+
+def run(sizes: list[int], repeat: int) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # keep the parsed-index cache out of the real one
+        os.environ['XDG_CACHE_HOME'] = tmp
+        for size in sizes:
+            path = Path(tmp) / f'hosts-{size}'
+            path.write_text(hostfile_text(size), encoding='utf-8')
+            for name, setup, args in cases(path):
+                seconds = best_of(repeat, setup, lambda _, args=args: call_command(
+                    'hostfile', '--file', str(path), *args, stdout=io.StringIO(), stderr=io.StringIO(),
+                ))
+                results.append({'name': name, 'lines': size, 'seconds': seconds})
+                print(f"{name:>12} {size:>10,} lines  {seconds * 1e3:10.3f} ms", file=sys.stderr)
+    return {'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000],
+                        help="hostfile sizes to generate, in lines")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per measurement; the best is kept")
+    parser.add_argument('--output', help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if not settings.configured:
+        settings.configure(
+            INSTALLED_APPS=['runserveronhostname'],
+            RUNSERVER_ON=f'{HOSTNAME}:8000',
+        )
+    django.setup()
+    results = run(args.sizes, args.repeat)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmarks for the hostfile parser.
+
+Run from the repository root, for example:
+
+    uv run python benchmarks/bench_hostfile.py --sizes 1000 10000 100000 --output before.json
+    uv run python benchmarks/bench_hostfile.py --output after.json --compare before.json
+
+Only the standard library is used. Each benchmark reports the best of
+`--repeat` runs, both in total and per operation. Memory taken by the
+optional indexes is reported too, but not compared.
+"""
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from hostfile_data import generate
+from runserveronhostname.hostfile_cache import load_hostfile
+from runserveronhostname.hostfile_parser import Hostfile, HostfileMembership
+
+
+def best_of(repeat: int, setup, fn) -> float:
+    "Best wall time of `fn(setup())` over `repeat` runs; setup isn't timed."
+    best = float('inf')
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def traced(fn) -> int:
+    "Bytes still allocated after calling `fn()`."
+    tracemalloc.start()
+    try:
+        fn()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size
+
+
+def benchmarks(text: str, path: Path):
+    """Yield (name, operations, setup, fn) for one generated hostfile.
+
+    `fn` gets the result of `setup()` and performs `operations` operations.
+    """
+    parsed = Hostfile(text)
+    hosts = list(parsed)
+    # sample a spread of hosts, and as many names which aren't there
+    step = max(1, len(hosts) // 1000)
+    present = hosts[::step]
+    absent = [f"missing{i}.example" for i in range(len(present))]
+    line_count = len(text.splitlines())
+    nothing = lambda: None
+
+    yield 'construct_str', 1, nothing, lambda _: Hostfile(text)
+    yield 'construct_path', 1, nothing, lambda _: Hostfile.from_path(path)
+    # the untimed setup makes sure this is a cache hit
+    yield 'construct_cached', 1, lambda: load_hostfile(path), lambda _: load_hostfile(path)
+    yield 'lazy_contains_first', 1, nothing, lambda _: 'localhost' in Hostfile.from_path(path, lazy=True)
+    yield 'lazy_contains_missing', 1, nothing, lambda _: 'missing.example' in Hostfile.from_path(path, lazy=True)
+    yield 'construct_membership', 1, nothing, lambda _: HostfileMembership.from_path(path)
+    membership = HostfileMembership.from_path(path)
+    yield 'membership_hit', len(present), nothing, lambda _: [h in membership for h in present]
+    yield 'membership_miss', len(absent), nothing, lambda _: [h in membership for h in absent]
+    yield 'contains_hit', len(present), nothing, lambda _: [h in parsed for h in present]
+    yield 'contains_miss', len(absent), nothing, lambda _: [h in parsed for h in absent]
+    # the generated names are all lowercase, so uppercase is the worst case
+    shouted = Hostfile(text.upper())
+    for name, hostfile in (('normal_index', parsed), ('normal_index_upper', shouted)):
+        yield name, len(hosts), lambda h=hostfile: setattr(h, '_normal_hosts', None), lambda _, h=hostfile: h._get_normal_hosts()
+    folded = [h.upper() for h in present]
+    yield 'contains_folded', len(folded), nothing, lambda _: [h in parsed for h in folded]
+    yield 'iterate', len(hosts), nothing, lambda _: [h for h in parsed]
+    yield 'ip_on_line', line_count, nothing, lambda _: [parsed.ip_on_line(n) for n in range(1, line_count + 1)]
+    for spec in ('raw', 'clean', 'simple'):
+        yield f'format_{spec}', 1, nothing, lambda _, spec=spec: format(parsed, spec)
+
+
+def memory(text: str):
+    "Yield (name, bytes) for the optional indexes built on first use."
+    for name, hostfile in (('normal_index', Hostfile(text)), ('normal_index_upper', Hostfile(text.upper()))):
+        hostfile._load()
+        yield name, traced(hostfile._get_normal_hosts)
+
+
+def run(sizes: list[int], repeat: int) -> dict:
+    results = []
+    memory_results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # keep the parsed-index cache out of the real one
+        os.environ['XDG_CACHE_HOME'] = tmp
+        for size in sizes:
+            text = generate(size)
+            path = Path(tmp) / f'hosts-{size}'
+            path.write_text(text, encoding='utf-8')
+            for name, ops, setup, fn in benchmarks(text, path):
+                seconds = best_of(repeat, setup, fn)
+                results.append({
+                    'name': name,
+                    'lines': size,
+                    'seconds': seconds,
+                    'per_op': seconds / ops,
+                })
+                print(f"{name:>24} {size:>9,} lines  {seconds * 1e3:10.3f} ms  {seconds / ops * 1e9:12.1f} ns/op", file=sys.stderr)
+            for name, size_bytes in memory(text):
+                memory_results.append({'name': name, 'lines': size, 'bytes': size_bytes})
+                print(f"{name:>24} {size:>9,} lines  {size_bytes / 1024:10.1f} KiB", file=sys.stderr)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'system': platform.system(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'repeat': repeat,
+        },
+        'results': results,
+        'memory': memory_results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    "Describe each benchmark that got more than `threshold` times slower."
+    before = {(r['name'], r['lines']): r['per_op'] for r in baseline['results']}
+    regressions = []
+    for r in current['results']:
+        old = before.get((r['name'], r['lines']))
+        if old and r['per_op'] / old > threshold:
+            regressions.append(f"{r['name']} @ {r['lines']:,} lines: {r['per_op'] / old:.2f}x slower")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help="hostfile sizes to generate, in lines (default: 1k, 10k and 100k)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark; the best is kept")
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON results to check for regressions against")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="slowdown ratio counted as a regression (default: 1.25)")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
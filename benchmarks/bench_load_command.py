@@ -0,0 +1,77 @@
+"""
+Time how long `load_command_class` takes to hand back a command.
+
+Run from the repository root, for example:
+
+    uv run python benchmarks/bench_load_command.py --number 20000
+
+Compares Django's own `load_command_class` with the patched one this app
+installs, for `runserver` (which gets PartialRunserverCommand mixed in)
+and for another command (which doesn't). `patched_uncached` composes the
+runserver class on every call, as the patch used to.
+"""
+import argparse
+import json
+from pathlib import Path
+import sys
+import timeit
+
+from django.conf import settings
+import django.core.management
+
+from runserveronhostname import apps
+
+
+def cases(app_name: str, name: str):
+    "Yield (case name, function) pairs loading command `name` from `app_name`."
+    original = django.core.management.load_command_class
+    yield 'django', lambda: original(app_name, name)
+    yield 'patched', lambda: apps.patched_load_command_class(app_name, name)
+    if name == 'runserver':
+        def uncached():
+            apps._composed_commands.clear()
+            return apps.patched_load_command_class(app_name, name)
+        yield 'patched_uncached', uncached
+
+
+def run(number: int, repeat: int) -> dict:
+    results = []
+    for app_name, name in (('django.core', 'runserver'), ('django.core', 'check')):
+        times = {}
+        for case, fn in cases(app_name, name):
+            # the first call imports the command's module
+            fn()
+            times[case] = min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+        for case, seconds in times.items():
+            result = {
+                'command': name,
+                'name': case,
+                'per_call': seconds,
+                'vs_django': seconds / times['django'],
+            }
+            results.append(result)
+            print(
+                f"{name:>10} {case:>16}  {seconds * 1e6:8.2f} us/call  {result['vs_django']:5.2f}x django",
+                file=sys.stderr,
+            )
+    return {'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=10_000, help="calls per measurement")
+    parser.add_argument('--repeat', type=int, default=5, help="measurements per case; the best is kept")
+    parser.add_argument('--output', help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if not settings.configured:
+        settings.configure()
+    results = run(args.number, args.repeat)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Find where parsing a hostfile across worker processes starts to pay off.
+
+Run from the repository root, for example:
+
+    uv run python benchmarks/bench_parallel.py --sizes 10000 100000 1000000 --workers 1 2 4 8
+
+For each size, every worker count is timed (best of `--repeat`) and the
+speedup over a single process reported. The crossover is the smallest
+size at which some worker count beats a single process.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+import sys
+import tempfile
+
+from bench_hostfile import best_of
+from hostfile_data import generate
+from runserveronhostname.hostfile_parser import Hostfile
+
+
+def run(sizes: list[int], workers: list[int], repeat: int) -> dict:
+    results = []
+    crossover = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = Path(tmp) / f'hosts-{size}'
+            path.write_text(generate(size), encoding='utf-8')
+            times = {
+                n: best_of(repeat, lambda: None, lambda _, n=n: Hostfile.from_path(path, workers=n))
+                for n in workers
+            }
+            for n, seconds in times.items():
+                speedup = times[workers[0]] / seconds
+                results.append({'lines': size, 'workers': n, 'seconds': seconds, 'speedup': speedup})
+                print(f"{size:>10,} lines  {n:>3} workers  {seconds * 1e3:10.1f} ms  {speedup:5.2f}x", file=sys.stderr)
+            if crossover is None and min(times.values()) < times[workers[0]]:
+                crossover = size
+    return {'cpus': os.cpu_count(), 'crossover_lines': crossover, 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="hostfile sizes to generate, in lines")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help="worker counts to try; the first is the baseline (default: 1 2 4)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement; the best is kept")
+    parser.add_argument('--output', help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.workers, args.repeat)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
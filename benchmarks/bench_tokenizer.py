@@ -0,0 +1,108 @@
+"""
+Compare the hostfile tokenizers with the line-by-line loops they replaced.
+
+Run from the repository root, for example:
+
+    uv run python benchmarks/bench_tokenizer.py --sizes 10000 100000 1000000
+
+Every tokenizer turns the same generated hostfile into each line's IP and
+hostnames, and is timed on its own (best of `--repeat`), without building
+any indexes. Speedups are relative to the old per-line loops.
+
+Only mapped files are tokenized a block at a time. Text is still
+tokenized a line at a time, since batching it measured no faster than
+`strip_split`; `tokenize_line` times that loop, comments included.
+"""
+import argparse
+import json
+from pathlib import Path
+import sys
+
+from bench_hostfile import best_of
+from hostfile_data import generate
+from runserveronhostname.hostfile_parser import _tokenize_buffer, _tokenize_line
+
+
+def strip_split(text: str):
+    "The old `Hostfile(str)` loop: strip(), split(maxsplit=1), then split() the rest."
+    for raw_line in text.splitlines(keepends=True):
+        line = raw_line.strip()
+        if len(line) == 0 or line[0] == '#':
+            continue
+        ip, rest = line.split(maxsplit=1)
+        rest.split()
+
+
+def bytes_split(buf: bytes):
+    "The old `Hostfile.from_path()` loop: find() each newline, split() and decode each field."
+    start, size = 0, len(buf)
+    while start < size:
+        end = buf.find(b'\n', start)
+        end = size if end == -1 else end + 1
+        fields = buf[start:end].split()
+        start = end
+        if fields and not fields[0].startswith(b'#'):
+            fields[0].decode()
+            [host.decode() for host in fields[1:]]
+
+
+def tokenize_line(text: str):
+    for line in text.splitlines(keepends=True):
+        _tokenize_line(line)
+
+
+def tokenize_buffer(buf: bytes):
+    for _ in _tokenize_buffer(buf, 0, len(buf)):
+        pass
+
+
+def run(sizes: list[int], repeat: int) -> dict:
+    results = []
+    for size in sizes:
+        text = generate(size)
+        buf = text.encode()
+        cases = {
+            'strip_split': (strip_split, text),
+            'bytes_split': (bytes_split, buf),
+            'tokenize_line': (tokenize_line, text),
+            'tokenize_buffer': (tokenize_buffer, buf),
+        }
+        times = {
+            name: best_of(repeat, lambda arg=arg: arg, fn)
+            for name, (fn, arg) in cases.items()
+        }
+        for name, seconds in times.items():
+            result = {
+                'name': name,
+                'lines': size,
+                'seconds': seconds,
+                'per_line': seconds / size,
+                'vs_strip_split': times['strip_split'] / seconds,
+                'vs_bytes_split': times['bytes_split'] / seconds,
+            }
+            results.append(result)
+            print(
+                f"{name:>16} {size:>10,} lines  {seconds / size * 1e9:8.1f} ns/line  "
+                f"{result['vs_strip_split']:5.2f}x strip_split  {result['vs_bytes_split']:5.2f}x bytes_split",
+                file=sys.stderr,
+            )
+    return {'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="hostfile sizes to generate, in lines")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per measurement; the best is kept")
+    parser.add_argument('--output', help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Synthetic hostfiles for benchmarking.
+
+The mix is loosely modelled on an /etc/hosts with an ad-block list
+merged in: mostly `0.0.0.0 one.host` lines, plus comments, blank
+lines, IPv6 entries and lines naming several hosts.
+"""
+import random
+
+
+WORDS = ['ads', 'track', 'cdn', 'metrics', 'static', 'api', 'beacon', 'pixel', 'img', 'login']
+TLDS = ['com', 'net', 'org', 'io', 'localhost', 'dev.internal']
+
+
+def hostname(rng: random.Random, n: int) -> str:
+    return f"{rng.choice(WORDS)}{n}.{rng.choice(WORDS)}.{rng.choice(TLDS)}"
+
+
+def generate(lines: int, seed: int = 1234) -> str:
+    """Return a hostfile with `lines` lines.
+
+    The output only depends on `lines` and `seed`, so runs are comparable.
+    """
+    rng = random.Random(seed)
+    out = [
+        "##\n",
+        "# Host Database\n",
+        "##\n",
+        "127.0.0.1\tlocalhost\n",
+        "255.255.255.255\tbroadcasthost\n",
+        "::1             localhost\n",
+    ]
+    n = 0
+    while len(out) < lines:
+        kind = rng.random()
+        if kind < 0.05:
+            out.append(f"# {rng.choice(WORDS)} section {n}\n")
+        elif kind < 0.08:
+            out.append("\n")
+        elif kind < 0.18:
+            n += 1
+            out.append(f"::{rng.randrange(1, 0xffff):x}\t{hostname(rng, n)}\n")
+        elif kind < 0.38:
+            hosts = []
+            for _ in range(rng.randint(2, 4)):
+                n += 1
+                hosts.append(hostname(rng, n))
+            out.append(f"127.0.0.{rng.randint(1, 254)}   {' '.join(hosts)}\n")
+        else:
+            n += 1
+            out.append(f"0.0.0.0 {hostname(rng, n)}\n")
+    return ''.join(out[:lines])
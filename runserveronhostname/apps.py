@@ -1,9 +1,26 @@
 from importlib import import_module
 
 from django.apps import AppConfig
-import django.core.management
 
-from runserveronhostname.management.commands._runserver import PartialRunserverCommand
+
+# app name -> (bases, composed Command class), so that autoreload restarts
+# and repeated call_command('runserver') reuse one class. A reloaded module
+# has a new Command class, which replaces its app's entry.
+_composed_commands = {}
+
+
+def _compose_runserver(app_name, base):
+    "Return a runserver Command class with PartialRunserverCommand mixed into `base`."
+    # imported only once runserver is asked for, so that processes which
+    # never run it (WSGI workers, celery, shell) don't pay for the import
+    from runserveronhostname.management.commands._runserver import PartialRunserverCommand
+    bases = (PartialRunserverCommand, base)
+    cached = _composed_commands.get(app_name)
+    if cached is not None and cached[0] == bases:
+        return cached[1]
+    Command = type('Command', bases, dict())
+    _composed_commands[app_name] = bases, Command
+    return Command
 
 
 def patched_load_command_class(app_name, name):
@@ -18,14 +35,18 @@ def patched_load_command_class(app_name, name):
     if name != 'runserver':
         return module.Command()
 
-    Command = type('Command', (PartialRunserverCommand, module.Command), dict())
-    return Command()
+    return _compose_runserver(app_name, module.Command)()
 
 
 class RunserveronhostnameConfig(AppConfig):
     name = 'runserveronhostname'
 
     def ready(self):
-        
+        # django.setup() has already imported these, so they cost nothing
+        from django.core import checks
+        import django.core.management
         django.core.management.load_command_class = patched_load_command_class
+
+        from runserveronhostname.checks import check_runserver_on
+        checks.register(check_runserver_on)
         return super().ready()
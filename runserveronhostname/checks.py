@@ -0,0 +1,65 @@
+"""
+System checks, so a RUNSERVER_ON hostname missing from the hostfile is
+reported when the server starts rather than when it fails to bind.
+"""
+import sys
+
+from django.conf import settings
+from django.core import checks
+
+
+# where Darwin and Linux keep it; the hostfile command's default too
+SYSTEM_HOSTFILE = '/etc/hosts'
+
+
+def system_hostfile() -> str|None:
+    "The system hostfile, on platforms where we know where it is."
+    return SYSTEM_HOSTFILE if sys.platform in ('darwin', 'linux') else None
+
+
+def runserver_on_hostname(runserver_on: str) -> str|None:
+    """The hostname in an addrport like RUNSERVER_ON, or None if there isn't one.
+
+    It's parsed as runserver will: a port alone, an IP address, or anything
+    runserver will reject itself has no hostname to look up or add.
+    """
+    # imported here so that processes which never need it don't pay for it
+    from django.core.management.commands.runserver import naiveip_re
+    from runserveronhostname.hostfile_parser import _parse_ip
+    match = naiveip_re.match(runserver_on)
+    if match is None or match['fqdn'] is None or _parse_ip(match['fqdn']) is not None:
+        return None
+    return match['fqdn']
+
+
+def check_runserver_on(app_configs, **kwargs):
+    "Warn if RUNSERVER_ON's hostname isn't in the system hostfile, or isn't loopback there."
+    runserver_on = getattr(settings, 'RUNSERVER_ON', None)
+    hostfile = system_hostfile()
+    if not runserver_on or hostfile is None:
+        return []
+
+    hostname = runserver_on_hostname(runserver_on)
+    if hostname is None:
+        return []
+    # imported here so that processes which never run checks don't pay for
+    # it; the answer is cached by the hostfile's inode, mtime and size
+    from runserveronhostname.hostfile_cache import cached_resolve
+    from runserveronhostname.hostfile_parser import _parse_ip
+    try:
+        ips = cached_resolve(hostfile, hostname)
+    except OSError:
+        return []
+
+    if not ips:
+        return [checks.Warning(
+            f"RUNSERVER_ON's hostname {hostname} isn't in {hostfile}.",
+            hint="Run `manage.py hostfile --in-place` to add it.",
+            id='runserveronhostname.W001',
+        )]
+    if not all((address := _parse_ip(ip)) is not None and address.is_loopback for ip in ips):
+        return [checks.Warning(
+            f"RUNSERVER_ON's hostname {hostname} doesn't point at a loopback address in {hostfile} ({', '.join(ips)}).",
+            id='runserveronhostname.W002',
+        )]
+    return []
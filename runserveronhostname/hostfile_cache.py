@@ -0,0 +1,116 @@
+"""
+On-disk cache of parsed hostfile indexes.
+
+Each hostfile gets one cache entry, keyed by its path. An entry is only
+used while the hostfile's device, inode, mtime and size all match what
+they were when it was parsed, so edits invalidate it automatically.
+Answers from `cached_resolve()` are kept alongside, the same way.
+"""
+import hashlib
+import marshal
+import os
+from pathlib import Path
+import tempfile
+
+from runserveronhostname.hostfile_parser import Hostfile, HostfileTimings, _MappedLines, _phase, _stat_key
+
+
+# bump this whenever the layout of `Hostfile._get_state()`, or what a parse
+# indexes, changes
+CACHE_VERSION = 7
+
+
+def cache_dir() -> Path:
+    "Where cache entries live, honoring XDG_CACHE_HOME."
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'runserveronhostname'
+
+
+def _entry_path(path: str) -> Path:
+    digest = hashlib.sha256(os.fsencode(path)).hexdigest()[:32]
+    return cache_dir() / f'{digest}.idx'
+
+
+def _file_key(path: str, st: os.stat_result) -> tuple:
+    return (path, *_stat_key(st))
+
+
+def load_hostfile(path: str|os.PathLike, timings: HostfileTimings|None = None) -> Hostfile:
+    """Return a fully-indexed Hostfile for `path`, from the cache if possible.
+
+    On a miss the file is parsed and the cache entry (re)written. Problems
+    reading or writing the cache are never fatal; they just mean parsing.
+    `timings` records whether the cache was hit, and where the time went.
+    """
+    path = os.path.abspath(path)
+    # stat before parsing, so a concurrent edit can only make the entry stale
+    st = os.stat(path)
+    key = _file_key(path, st)
+    entry = _entry_path(path)
+
+    hosts = None
+    with _phase(timings, 'cache'):
+        try:
+            # marshal.load() makes lots of small reads; one big one is much faster
+            with open(entry, 'rb') as f:
+                version, cached_key, state = marshal.loads(f.read())
+            if version == CACHE_VERSION and cached_key == key:
+                # None if the file changed after the stat above
+                hosts = Hostfile._from_state(path, state, _stat_key(st))
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+    if hosts is not None:
+        if timings is not None:
+            timings.cache = 'hit'
+            hosts._timings = timings
+        return hosts
+
+    hosts = Hostfile.from_path(path, timings=timings)
+    if timings is not None:
+        timings.cache = 'miss'
+    # compressed hostfiles are parsed as a stream, with no offsets to cache
+    if type(hosts._contents) is _MappedLines:
+        with _phase(timings, 'cache'):
+            # so case-insensitive lookups needn't normalize every host on each load
+            hosts._get_normal_hosts()
+            _write_entry(entry, (CACHE_VERSION, key, hosts._get_state()))
+    return hosts
+
+
+def cached_resolve(path: str|os.PathLike, host: str) -> list[str]:
+    """Return the IPs `host` maps to in the hostfile at `path`, remembering the answer.
+
+    Asking again while the file is unchanged reads one small file instead
+    of the whole index, which suits a check made on every process start.
+    """
+    path = os.path.abspath(path)
+    key = _file_key(path, os.stat(path))
+    entry = _entry_path(path).with_suffix('.hosts')
+
+    answers = {}
+    try:
+        with open(entry, 'rb') as f:
+            version, cached_key, cached = marshal.loads(f.read())
+        if version == CACHE_VERSION and cached_key == key:
+            answers = cached
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    if host in answers:
+        return answers[host]
+
+    answers[host] = load_hostfile(path).resolve(host)
+    _write_entry(entry, (CACHE_VERSION, key, answers))
+    return answers[host]
+
+
+def _write_entry(entry: Path, value: tuple):
+    try:
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=entry.parent, delete=False) as f:
+            f.write(marshal.dumps(value))
+    except OSError:
+        return
+    try:
+        os.replace(f.name, entry)
+    except OSError:
+        os.unlink(f.name)
@@ -1,56 +1,1189 @@
+from array import array
+from bisect import bisect_left, bisect_right
+import bz2
 from collections import defaultdict
-from collections.abc import Mapping
+from collections.abc import Container, Iterable, Iterator, Mapping, Sequence
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+import gzip
+import hashlib
+import heapq
+import io
+import ipaddress
+from itertools import accumulate, chain, islice, repeat
+import lzma
+import marshal
+import mmap
+from operator import add, methodcaller
+import os
+from os import PathLike
+import re
+import sys
+from time import perf_counter
+import tracemalloc
 from typing import IO
 
 
+def _map_file(path: str|PathLike):
+    """Memory-map a file for reading, returning the mapping and its stat.
+
+    The mapping outlives the open file.
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), st
+        except ValueError:
+            # empty files can't be mapped
+            return b'', st
+
+
+# leading magic bytes -> opener, for compressed hostfiles
+_COMPRESSED = (
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+)
+
+
+def _compression(head: bytes):
+    "The opener for a compressed file starting with `head`, or None if it isn't one."
+    for magic, opener in _COMPRESSED:
+        if head[:len(magic)] == magic:
+            return opener
+    return None
+
+
+class _BufferReader(io.RawIOBase):
+    "A file reading from a buffer, so a mapped file can be decompressed any number of times at once."
+    def __init__(self, buf):
+        self._view = memoryview(buf)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._view[self._pos:self._pos + len(b)]
+        b[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+
+def _decompressed_lines(opener, buf) -> Iterator[str]:
+    "Stream the lines of a compressed file's mapped contents, closing the decompressor once they run out."
+    with opener(_BufferReader(buf), 'rt', encoding='utf-8', errors='surrogateescape', newline='') as f:
+        yield from f
+
+
+# a carriage return not followed by a newline, which ends a line on its own
+_LONE_CR = re.compile(rb'\r(?!\n)')
+
+
+def _has_lone_cr(buf) -> bool:
+    # most files have no \r at all, which find() rules out faster
+    return buf.find(b'\r') != -1 and _LONE_CR.search(buf) is not None
+
+
+def _text_lines(buf) -> Iterator[str]:
+    "Split a buffer into lines ending in `\\n`, `\\r\\n` or `\\r`, kept as they are."
+    return io.StringIO(buf[:].decode('utf-8', 'surrogateescape'), newline='')
+
+
+# bytes of a mapped hostfile decoded and tokenized at a time: small at
+# first, so a lookup near the top of the file stays cheap, then growing
+_TOKENIZE_FIRST_BLOCK = 1 << 10
+_TOKENIZE_BLOCK = 1 << 16
+_encode = methodcaller('encode', 'utf-8', 'surrogateescape')
+
+
+def _split_fields(lines: Sequence[str], joined: str) -> tuple[Iterator[list[str]], Iterator[str|None]]:
+    """Tokenize lines without their newlines, returning iterators of their fields and inline comments.
+
+    A line's fields are its IP then its hostnames, or nothing for blank
+    and comment lines; its comment is whatever follows a `#` after the
+    fields, or None. Lines go through `str.split()` by way of `map()`, so
+    the per-line work runs at C speed; only lines with a `#` in are
+    looked at one by one, found by searching the whole batch at once.
+    `joined` is `'\n'.join(lines)`, which the caller already has.
+    """
+    pos = joined.find('#')
+    if pos == -1:
+        return map(str.split, lines), repeat(None)
+
+    heads = list(lines)
+    comments = {}
+    idx, line_start = 0, 0
+    while pos != -1:
+        # count the lines skipped over to find which one this is
+        idx += joined.count('\n', line_start, pos)
+        line_start = joined.rfind('\n', 0, pos) + 1
+        head, _, comment = lines[idx].partition('#')
+        if head.isspace() or not head:
+            heads[idx] = ''
+        else:
+            heads[idx] = head
+            comments[idx] = comment
+        line_end = joined.find('\n', pos)
+        if line_end == -1:
+            break
+        pos = joined.find('#', line_end)
+    if not comments:
+        return map(str.split, heads), repeat(None)
+    return map(str.split, heads), map(comments.get, range(len(lines)))
+
+
+def _tokenize_line(line: str) -> tuple[list[str], str|None]:
+    "Split one line of text into its fields and inline comment, as `_split_fields()` does for a batch."
+    head, sep, comment = line.partition('#')
+    return head.split(), comment if sep else None
+
+
+def _tokenize_buffer(buf, start: int, stop: int) -> Iterator[tuple[int, list[str], str|None]]:
+    """Iterate `(end offset, fields, comment)` for each line of `buf[start:stop]`.
+
+    The buffer is decoded and split a block of whole lines at a time,
+    rather than line by line, and the lines of each block are handed out
+    by C iterators with no Python code run per line.
+    """
+    return chain.from_iterable(_tokenize_blocks(buf, start, stop))
+
+
+def _tokenize_blocks(buf, start: int, stop: int) -> Iterator[Iterator[tuple[int, list[str], str|None]]]:
+    block_size = _TOKENIZE_FIRST_BLOCK
+    while start < stop:
+        cut = buf.find(b'\n', start + block_size - 1, stop)
+        block_size = min(block_size * 4, _TOKENIZE_BLOCK)
+        cut = stop if cut == -1 else cut + 1
+        block = buf[start:cut]
+        text = block.decode('utf-8', 'surrogateescape')
+        lines = text.split('\n')
+        if not lines[-1]:
+            lines.pop()
+        # each line ends its length plus a newline after the last one
+        sizes = map(len, lines) if block.isascii() else map(len, map(_encode, lines))
+        ends = accumulate(map(add, sizes, repeat(1)), initial=start)
+        next(ends)
+        if text[-1] != '\n':
+            # ...except an unterminated last line
+            ends = list(ends)
+            ends[-1] = cut
+        yield zip(ends, *_split_fields(lines, text))
+        start = cut
+
+
+def _stat_key(st: os.stat_result) -> tuple:
+    "Enough of a file's stat to tell whether it has changed."
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _digest(buf) -> bytes:
+    return hashlib.blake2b(buf, digest_size=16).digest()
+
+
+@lru_cache(maxsize=4096)
+def _parse_ip(ip: str) -> ipaddress.IPv4Address|ipaddress.IPv6Address|None:
+    """Parse an IP from a hostfile into its normalized form, or None if it isn't one.
+
+    IPv4-mapped IPv6 addresses become IPv4 and zero-padded dotted quads
+    (`127.000.000.001`) are read as decimal, so each spelling of an
+    address compares equal. Hostfiles repeat a handful of IPs, hence the
+    cache.
+    """
+    try:
+        address = ipaddress.ip_address(ip.split('%', 1)[0])
+    except ValueError:
+        parts = ip.split('.')
+        if len(parts) != 4 or not all(part.isdigit() and len(part) <= 3 for part in parts):
+            return None
+        try:
+            return ipaddress.IPv4Address('.'.join(str(int(part)) for part in parts))
+        except ValueError:
+            return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        return address.ipv4_mapped
+    return address
+
+
+@lru_cache(maxsize=4096)
+def _normalize_host(host: str) -> str:
+    """The form of a hostname to compare by: lowercase, and Unicode labels IDNA-encoded.
+
+    So `MyApp.localhost` matches `myapp.localhost`, and `bücher.example`
+    matches `xn--bcher-kva.example`. A name the IDNA codec rejects is
+    just lowercased. Lookups repeat the same few names, hence the cache.
+    """
+    host = host.lower()
+    if host.isascii():
+        return host
+    try:
+        return host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return host
+
+
+def _check_entry(ip: str, hosts: Sequence[str]):
+    "Raise ValueError unless `ip` and `hosts` make a line that reads back as just that."
+    if not hosts:
+        raise ValueError('at least one host is needed')
+    for token in (ip, *hosts):
+        # a '#' anywhere would start a comment when the file is read back
+        if not token or '#' in token or len(token.split()) != 1:
+            raise ValueError(f'{token!r} is not a valid hostfile entry')
+
+
+class _MappedLines(Sequence):
+    """Lines of a memory-mapped file, stored as an offset table.
+
+    Lines are only decoded to `str` when something asks for them. Lines
+    can be replaced or appended like a list; those are kept aside since
+    the mapping is read-only.
+    """
+    def __init__(self, buf):
+        self._buf = buf
+        # line N spans _offsets[N-1]:_offsets[N]
+        self._offsets = array('Q', [0])
+        # replaced and appended lines, by index
+        self._edits = {}
+        self._appended = 0
+
+    def _index(self, idx: int) -> int:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('line index out of range')
+        return idx
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        idx = self._index(idx)
+        if idx in self._edits:
+            return self._edits[idx]
+        return self._buf[self._offsets[idx]:self._offsets[idx+1]].decode('utf-8', 'surrogateescape')
+
+    def __setitem__(self, idx: int, line: str):
+        self._edits[self._index(idx)] = line
+
+    def append(self, line: str):
+        self._appended += 1
+        self._edits[len(self) - 1] = line
+
+    def __len__(self):
+        return len(self._offsets) - 1 + self._appended
+
+
+class _StreamedLines(Sequence):
+    """Lines of a compressed file, decompressed again whenever they're read.
+
+    Only blank and comment lines, which the clean format prints and which
+    are few, and the last line are kept as text; entries are read back
+    from the compressed bytes, so a large compressed hostfile isn't held
+    in memory decompressed. Reading one entry decompresses up to it, and
+    iterating decompresses the file once. Lines can be replaced or
+    appended like a list; those are kept too.
+    """
+    def __init__(self, buf, opener):
+        self._buf = buf
+        self._opener = opener
+        # lines parsed so far, which is how many to read back
+        self._parsed = 0
+        # kept, replaced and appended lines, by index
+        self._kept = {}
+        self._appended = 0
+
+    def _index(self, idx: int) -> int:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('line index out of range')
+        return idx
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return list(self)[idx]
+        idx = self._index(idx)
+        if idx in self._kept:
+            return self._kept[idx]
+        return next(islice(_decompressed_lines(self._opener, self._buf), idx, None))
+
+    def __iter__(self):
+        kept = self._kept
+        lines = islice(_decompressed_lines(self._opener, self._buf), self._parsed)
+        for idx, line in enumerate(lines):
+            yield kept.get(idx, line)
+        for idx in range(self._parsed, len(self)):
+            yield kept[idx]
+
+    def __setitem__(self, idx: int, line: str):
+        self._kept[self._index(idx)] = line
+
+    def append(self, line: str):
+        self._appended += 1
+        self._kept[len(self) - 1] = line
+
+    def __len__(self):
+        return self._parsed + self._appended
+
+
+class _HostRecord:
+    """The lines and IPs for a hostname defined on more than one line.
+
+    Most hosts appear on exactly one line, so the host index stores just
+    that line number (its IP is in the line -> IP table) and only
+    promotes it to one of these on the second.
+    """
+    __slots__ = ('lines', 'ips')
+
+    def __init__(self, lines: array, ips: tuple[str, ...]):
+        self.lines = lines
+        self.ips = ips
+
+    def add(self, line: int, ip: str):
+        self.lines.append(line)
+        if ip not in self.ips:
+            self.ips += (ip,)
+
+
+class HostfileTimings:
+    """Where the time, and memory, goes while reading and using a Hostfile.
+
+    Pass one as `timings=` to `Hostfile.from_path()` or `load_hostfile()`.
+    The Hostfile keeps adding to it whenever it parses (lazily, or on
+    refresh) or formats. `phases` holds the seconds spent in each of:
+
+    - read: mapping the file, or reading and decompressing it
+    - cache: loading or storing the on-disk index cache
+    - tokenize: splitting lines into IPs and hostnames
+    - index: building the indexes from those
+    - parse: tokenize and index together, when split across worker processes
+    - format: writing the hostfile out with `write_to()` or `format()`
+
+    Telling tokenizing from indexing means timing every line, so an
+    instrumented parse runs a little slower than a plain one.
+    """
+    PHASES = ('read', 'cache', 'tokenize', 'index', 'parse', 'format')
+
+    def __init__(self):
+        self.phases = {}
+        # lines parsed, for lines_per_second
+        self.lines = 0
+        # 'hit' or 'miss', when the on-disk cache was used
+        self.cache = None
+        # peak bytes traced by tracemalloc within tracking_memory()
+        self.peak_memory = None
+
+    def _add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, phase: str):
+        "Add the time spent in this block to `phase`."
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._add(phase, perf_counter() - start)
+
+    def _timed(self, iterable: Iterable, phase: str) -> Iterator:
+        "Pass `iterable` through, adding the time taken to produce each item to `phase`."
+        iterator = iter(iterable)
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._add(phase, perf_counter() - start)
+                return
+            self._add(phase, perf_counter() - start)
+            yield item
+
+    @contextmanager
+    def tracking_memory(self):
+        """Record the peak memory allocated within this block in `peak_memory`.
+
+        tracemalloc is started for the block if it isn't already running.
+        Tracing every allocation is slow, so phase times taken inside this
+        block are inflated too.
+        """
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            if started:
+                tracemalloc.stop()
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    @property
+    def lines_per_second(self) -> float|None:
+        parsing = sum(self.phases.get(phase, 0.0) for phase in ('tokenize', 'index', 'parse'))
+        return self.lines / parsing if parsing else None
+
+    def report(self) -> list[str]:
+        "A human-readable summary, one line per item."
+        lines = [
+            f"{phase:<9} {self.phases[phase] * 1e3:10.3f} ms"
+            for phase in self.PHASES if phase in self.phases
+        ]
+        lines.append(f"{'total':<9} {self.total * 1e3:10.3f} ms")
+        if self.cache is not None:
+            lines.append(f"cache     {self.cache}")
+        if self.lines_per_second is not None:
+            lines.append(f"parsed    {self.lines:,} lines, {self.lines_per_second:,.0f} lines/s")
+        if self.peak_memory is not None:
+            lines.append(f"memory    {self.peak_memory / 1024:,.1f} KiB peak (tracemalloc)")
+        return lines
+
+
+def _phase(timings: HostfileTimings|None, phase: str):
+    "`timings.phase(phase)`, or nothing when there are no timings."
+    return nullcontext() if timings is None else timings.phase(phase)
+
+
 class Hostfile(Mapping):
-    def __init__(self, text_or_file: str|IO):
+    def __init__(self, text_or_file: str|IO, *, lazy: bool = False):
+        """Parse a hostfile from a string or an open file.
+
+        With `lazy=True`, lines are only read and indexed as queries need
+        them: a membership test stops at the first line defining the host,
+        while iteration, lookups and formatting parse the rest. A lazy
+        Hostfile reads from `text_or_file` on demand, so an open file must
+        stay open until the Hostfile has been queried.
+        """
         if isinstance(text_or_file, str):
-            self._contents = text_or_file.splitlines(keepends=True)
+            lines = text_or_file.splitlines(keepends=True)
         else:
-            self._contents = [l for l in text_or_file.readlines()]
-        self._ips = defaultdict(list)
-        self._hosts = defaultdict(list)
-
-        for idx, line in enumerate(self._contents, start=1):
-            line = line.strip()
-            # skip comments and blank lines
-            if len(line) == 0 or line[0] == '#':
+            lines = text_or_file
+        self._path = None
+        self._timings = None
+        self._setup([], self._index_lines(lines), lazy)
+
+    @classmethod
+    def from_path(
+        cls,
+        path: str|PathLike,
+        *,
+        lazy: bool = False,
+        workers: int = 1,
+        timings: HostfileTimings|None = None,
+    ):
+        """Parse the hostfile at `path` by memory-mapping it.
+
+        Lines are tokenized as bytes and only the IPs and hostnames are
+        decoded. The mapping outlives the open file, so a lazy Hostfile
+        from here can be queried at any time.
+
+        With `workers` greater than 1, the file is split into that many
+        chunks on line boundaries, which are parsed in a process pool and
+        then merged. That only pays off for very large files; see
+        `benchmarks/bench_parallel.py`. If all you need is membership
+        tests on a very large file, `HostfileMembership` is much smaller.
+
+        gzip, bz2 and xz files are recognized by their first bytes and
+        decompressed as a stream straight into the parser. Those can't be
+        split across workers. Their entries aren't kept decompressed, so
+        formatting one decompresses it again. Files with lines ending in a
+        bare `\\r` are kept as lines of text rather than mapped, and
+        parsed in one process whatever `workers` is.
+
+        Pass a `HostfileTimings` as `timings` to see where the time goes.
+        """
+        if lazy and workers > 1:
+            raise ValueError("lazy parsing can't be split across workers")
+        self = cls.__new__(cls)
+        self._path = path
+        self._timings = timings
+        self._map_and_parse(lazy, workers)
+        return self
+
+    def _map_and_parse(self, lazy: bool, workers: int = 1):
+        with _phase(self._timings, 'read'):
+            buf, st = _map_file(self._path)
+        self._stat_key = _stat_key(st)
+        opener = _compression(buf)
+        if opener is not None:
+            if workers > 1:
+                raise ValueError("compressed hostfiles can't be split across workers")
+            contents = _StreamedLines(buf, opener)
+            lines = _decompressed_lines(opener, buf)
+            if self._timings is not None:
+                lines = self._timings._timed(lines, 'read')
+            self._setup(contents, self._index_stream(lines, contents), lazy)
+            return
+        if _has_lone_cr(buf):
+            # the byte tokenizer only splits on \n
+            self._setup([], self._index_lines(_text_lines(buf)), lazy)
+            return
+        contents = _MappedLines(buf)
+        if workers > 1:
+            self._setup(contents, None, lazy=True)
+            with _phase(self._timings, 'parse'):
+                self._parse_parallel(buf, workers)
+            if self._timings is not None:
+                self._timings.lines += len(contents)
+        else:
+            self._setup(contents, self._index_buffer(buf, contents), lazy)
+
+    def _parse_parallel(self, buf, workers: int):
+        size = len(buf)
+        bounds = [0]
+        for n in range(1, workers):
+            cut = buf.find(b'\n', max(bounds[-1], size * n // workers))
+            if cut == -1 or cut + 1 >= size:
+                break
+            bounds.append(cut + 1)
+        bounds.append(size)
+        starts, ends = bounds[:-1], bounds[1:]
+
+        first_lines = [1]
+        for start, end in zip(starts[:-1], ends[:-1]):
+            first_lines.append(first_lines[-1] + buf[start:end].count(b'\n'))
+
+        # only imported when needed: it's most of this module's import time,
+        # which the system check pays on every runserver restart
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=len(starts)) as pool:
+            chunks = pool.map(_parse_chunk, repeat(self._path), starts, ends, first_lines)
+            for chunk in chunks:
+                self._merge_state(marshal.loads(chunk))
+        self._digest = _digest(buf)
+
+    def _shift_lines(self, by: int):
+        "Renumber every line in the indexes, for a chunk which didn't start at line 1."
+        for ip, lines in self._ips.items():
+            self._ips[ip] = array('I', [line + by for line in lines])
+        for host, entry in self._hosts.items():
+            if type(entry) is int:
+                self._hosts[host] = entry + by
+            else:
+                entry.lines = array('I', [line + by for line in entry.lines])
+        self._line_comments = {idx + by: comment for idx, comment in self._line_comments.items()}
+
+    def _merge_state(self, state: tuple):
+        "Add a `_get_state()` for the chunk of the file following this one."
+        offsets, line_ips, line_hosts, line_comments, ips, hosts, records, ip_hosts, _, _ = state
+        self._contents._offsets.frombytes(offsets[self._contents._offsets.itemsize:])
+        self._line_ips += line_ips
+        self._line_hosts += line_hosts
+        self._line_comments.update(line_comments)
+        for ip, lines in ips.items():
+            self._ips[ip].frombytes(lines)
+        for host in records:
+            lines, host_ips = hosts[host]
+            hosts[host] = _HostRecord(array('I', lines), host_ips)
+        # hosts in both chunks need their lines and IPs combined
+        for host in hosts.keys() & self._hosts.keys():
+            hosts[host] = _HostRecord(
+                array('I', self._entry_lines(self._hosts[host]) + self._entry_lines(hosts[host])),
+                tuple(dict.fromkeys(self._entry_ips(self._hosts[host]) + self._entry_ips(hosts[host]))),
+            )
+        self._hosts.update(hosts)
+        for ip, hosts in ip_hosts.items():
+            self._ip_hosts[ip].update(dict.fromkeys(hosts))
+
+    def refresh(self) -> bool:
+        """Catch up with changes to the file this Hostfile was read from.
+
+        If the file has only been appended to, just the new lines are
+        parsed and added to the indexes; any other change means parsing
+        it again from scratch. Returns whether anything changed. Only
+        Hostfiles from `from_path()` can be refreshed, and if the file has
+        changed, edits made with `add()`, `remove()` or `set()` are lost.
+        """
+        if self._path is None:
+            raise ValueError('only a Hostfile read with from_path() can be refreshed')
+        self._load()
+        if _stat_key(os.stat(self._path)) == self._stat_key:
+            return False
+        if self._edited or type(self._contents) is not _MappedLines:
+            # edits would be lost either way, and a compressed file can't
+            # be checked for appends; don't try to line them up
+            self._map_and_parse(lazy=False)
+            return True
+
+        buf, st = _map_file(self._path)
+        self._stat_key = _stat_key(st)
+        contents = self._contents
+        old_size = contents._offsets[-1]
+        appended = (
+            len(buf) >= old_size
+            # a partial last line may have been extended, not just followed
+            and (old_size == 0 or buf[old_size-1] == ord('\n'))
+            and _digest(memoryview(buf)[:old_size]) == self._digest
+        )
+        if not appended:
+            self._map_and_parse(lazy=False)
+            return True
+        if len(buf) == old_size:
+            # touched, but the contents are the same
+            return False
+
+        contents._buf = buf
+        self._pending = self._index_buffer(buf, contents, start=old_size)
+        self._load()
+        return True
+
+    def refresh_changes(self) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]|None:
+        """Like `refresh()`, but return the `(host, IP)` mappings it added and removed.
+
+        Returns None if the file hasn't changed. When the file was only
+        appended to, just the new lines are looked at; otherwise the old
+        and new indexes are compared.
+        """
+        self._load()
+        old_ip_hosts = self._ip_hosts
+        old_count = len(self._contents)
+        if not self.refresh():
+            return None
+
+        if self._ip_hosts is not old_ip_hosts:
+            added = [
+                (host, ip) for ip, hosts in self._ip_hosts.items()
+                for host in hosts if host not in old_ip_hosts.get(ip, ())
+            ]
+            removed = [
+                (host, ip) for ip, hosts in old_ip_hosts.items()
+                for host in hosts if host not in self._ip_hosts.get(ip, ())
+            ]
+            return added, removed
+
+        added = {}
+        for idx in range(old_count, len(self._contents)):
+            ip = self._line_ips[idx]
+            if ip is None:
                 continue
+            hosts = self._line_hosts[idx]
+            for host in (hosts,) if type(hosts) is str else hosts:
+                seen = any(
+                    line <= old_count and self._line_ips[line-1] == ip
+                    for line in self._entry_lines(self._hosts[host])
+                )
+                if not seen:
+                    added[host, ip] = None
+        return list(added), []
+
+    def _get_state(self) -> tuple:
+        """Return the parsed indexes as plain values that `marshal` can store.
+
+        Only Hostfiles from `from_path()` have state; `_from_state()` turns
+        it back into a Hostfile without parsing anything.
+        """
+        self._load()
+        hosts = dict(self._hosts)
+        records = [host for host, entry in hosts.items() if type(entry) is _HostRecord]
+        for host in records:
+            hosts[host] = (hosts[host].lines.tobytes(), hosts[host].ips)
+        return (
+            self._contents._offsets.tobytes(),
+            self._line_ips,
+            self._line_hosts,
+            self._line_comments,
+            {ip: self._ip_lines(ip).tobytes() for ip in self._ips},
+            hosts,
+            records,
+            {ip: tuple(hosts) for ip, hosts in self._ip_hosts.items()},
+            self._digest,
+            # None unless it's been built
+            self._normal_hosts,
+        )
+
+    @classmethod
+    def _from_state(cls, path: str|PathLike, state: tuple, stat_key: tuple):
+        """Rebuild a Hostfile for `path` from `_get_state()`, or return None if it's stale.
+
+        `stat_key` is the `_stat_key()` the state was saved for. The file
+        is mapped again here, so if it has changed since, the mapping no
+        longer matches the offsets in `state`.
+        """
+        buf, st = _map_file(path)
+        if _stat_key(st) != stat_key:
+            return None
+        offsets, line_ips, line_hosts, line_comments, ips, hosts, records, ip_hosts, digest, normal_hosts = state
+        self = cls.__new__(cls)
+        self._path = path
+        self._timings = None
+        self._stat_key = stat_key
+        contents = _MappedLines(buf)
+        contents._offsets = array('Q', offsets)
+        self._setup(contents, None, lazy=True)
+        self._digest = digest
+        self._line_ips = line_ips
+        self._line_hosts = line_hosts
+        self._line_comments = line_comments
+        self._ips.update((ip, array('I', lines)) for ip, lines in ips.items())
+        # single-line hosts come back from marshal ready to use
+        self._hosts = hosts
+        for host in records:
+            lines, host_ips = hosts[host]
+            hosts[host] = _HostRecord(array('I', lines), host_ips)
+        self._ip_hosts.update((ip, dict.fromkeys(ip_hosts)) for ip, ip_hosts in ip_hosts.items())
+        self._normal_hosts = normal_hosts
+        return self
+
+    def _setup(self, contents, pending, lazy):
+        self._contents = contents
+        self._pending = pending
+        # IP -> lines, and host -> line number or _HostRecord
+        self._ips = defaultdict(lambda: array('I'))
+        # IP -> how many of its lines remove() has emptied; those stay in
+        # its array, as taking them out would shift every line after them
+        self._dropped_lines = {}
+        self._hosts = {}
+        # line -> IP and line -> host(s) tables (index 0 is line 1), and a
+        # reverse index whose inner dicts are used as insertion-ordered sets
+        self._line_ips = []
+        self._line_hosts = []
+        # line index -> inline comment, for the few lines which have one
+        self._line_comments = {}
+        self._ip_hosts = defaultdict(dict)
+        # reversed-label trie of hostnames, built on first use by _get_trie()
+        self._trie = None
+        # normalized host -> the host(s) which are spelt differently, built
+        # on first use by _get_normal_hosts(); most names are already normal
+        self._normal_hosts = None
+        # sorted packed IPs per address family, built on first use by _get_ip_index()
+        self._ip_index = None
+        # digest of the parsed bytes, set by _index_buffer() for refresh()
+        self._digest = None
+        # whether add(), remove() or set() have been used
+        self._edited = False
+
+        if not lazy:
+            self._load()
+
+    def _load(self, until: str|None = None):
+        "Parse pending lines. If `until` is given, stop once it's been seen."
+        if self._pending is None:
+            return
+        timings = self._timings
+        if timings is not None:
+            start, elsewhere, parsed = perf_counter(), timings.total, len(self._contents)
+        try:
+            for _ in self._pending:
+                if until is not None and until in self._hosts:
+                    return
+            self._pending = None
+        finally:
+            if timings is not None:
+                # whatever wasn't reading or tokenizing was indexing
+                timings._add('index', perf_counter() - start - (timings.total - elsewhere))
+                timings.lines += len(self._contents) - parsed
+
+    def _index_lines(self, lines: Iterable[str]):
+        "Tokenize lines of text, yielding after each line is indexed."
+        add_line = self._contents.append
+        for line in lines:
+            add_line(line)
+            fields, comment = _tokenize_line(line)
+            if len(fields) > 1:
+                self._index_entry(fields[0], fields[1:], comment)
+            else:
+                self._index_blank()
+            yield
+
+    def _index_stream(self, lines: Iterable[str], contents: _StreamedLines):
+        "Tokenize decompressed lines of text, keeping only what formatting needs, yielding after each line is indexed."
+        line = None
+        for line in lines:
+            contents._parsed += 1
+            fields, comment = _tokenize_line(line)
+            if len(fields) > 1:
+                self._index_entry(fields[0], fields[1:], comment)
+            else:
+                contents._kept[contents._parsed - 1] = line
+                self._index_blank()
+            yield
+        if line is not None:
+            # so add() can tell whether it needs a newline first
+            contents._kept[contents._parsed - 1] = line
+
+    def _index_buffer(self, buf, contents: _MappedLines, start: int = 0, stop: int|None = None):
+        "Tokenize a bytes buffer, yielding after each line is indexed."
+        tokens = _tokenize_buffer(buf, start, len(buf) if stop is None else stop)
+        if self._timings is not None:
+            tokens = self._timings._timed(tokens, 'tokenize')
+        add_line = contents._offsets.append
+        for end, fields, comment in tokens:
+            add_line(end)
+            if len(fields) > 1:
+                self._index_entry(fields[0], fields[1:], comment)
+            else:
+                self._index_blank()
+            yield
+        if stop is None:
+            self._digest = _digest(buf)
+
+    def _index_blank(self):
+        "Index a comment or blank line, or an IP naming no hosts, none of which are entries."
+        self._line_ips.append(None)
+        self._line_hosts.append(None)
+
+    def _index_entry(self, ip: str, hosts: list[str], comment: str|None = None):
+        idx = len(self._contents)
+        # the same few IPs repeat on every line, so share one copy
+        ip = sys.intern(ip)
+        self._line_ips.append(ip)
+        if ip not in self._ips:
+            self._ip_index = None
+        # most lines name one host, which can share the index's copy
+        self._line_hosts.append(hosts[0] if len(hosts) == 1 else tuple(hosts))
+        self._ips[ip].append(idx)
+        ip_hosts = self._ip_hosts[ip]
+        for host in hosts:
+            entry = self._hosts.get(host)
+            if entry is None:
+                self._hosts[host] = idx
+                if self._trie is not None:
+                    self._trie_insert(host)
+                if self._normal_hosts is not None:
+                    self._normal_hosts_insert(host)
+            elif type(entry) is int:
+                first_ip = self._line_ips[entry-1]
+                ips = (first_ip,) if ip == first_ip else (first_ip, ip)
+                self._hosts[host] = _HostRecord(array('I', (entry, idx)), ips)
+            else:
+                entry.add(idx, ip)
+            ip_hosts[host] = None
+        if comment is not None and (comment := comment.strip()):
+            self._line_comments[len(self._line_ips) - 1] = comment
 
-            # parse lines so we can quickly answer containment questions
-            ip, rest = line.split(maxsplit=1)
-            hosts = rest.split()
-            self._ips[ip].append(idx)
-            for host in hosts:
-                self._hosts[host].append(idx)
-    
     def __contains__(self, x):
-        "Check if a given host is present in this hostfile"
-        return x in self._hosts
+        "Check if a given host is present in this hostfile, ignoring case"
+        if x not in self._hosts:
+            self._load(until=x)
+            if x not in self._hosts:
+                # only now is the whole file parsed, and a spelling sure to be missing
+                if not isinstance(x, str):
+                    return False
+                key = x.lower() if x.isascii() else _normalize_host(x)
+                return key in self._hosts or key in self._get_normal_hosts()
+        return True
     
+    def contains_many(self, hosts: Iterable[str]) -> Iterator[tuple[str, bool]]:
+        """Check several hosts, yielding (host, present) pairs as each is answered.
+
+        The file is parsed at most once however many hosts are checked.
+        """
+        for host in hosts:
+            yield host, host in self
+
+    def missing(self, hosts: Iterable[str]) -> list[str]:
+        "Returns the hosts which aren't in this hostfile, in the order given."
+        return [host for host, found in self.contains_many(hosts) if not found]
+
+    def _trie_insert(self, host: str):
+        # labels are normalized, so every spelling of a name shares a node
+        key = host if host.isascii() and host.islower() else _normalize_host(host)
+        node = self._trie
+        for label in reversed(key.split('.')):
+            node = node.setdefault(label, {})
+        # the None key marks a node which is itself a host, as first spelt
+        node.setdefault(None, host)
+
+    def _trie_remove(self, host: str):
+        # remove() takes out every spelling, so the node may already be gone
+        key = host if host.isascii() and host.islower() else _normalize_host(host)
+        labels = key.split('.')[::-1]
+        nodes = [self._trie]
+        for label in labels:
+            node = nodes[-1].get(label)
+            if node is None:
+                return
+            nodes.append(node)
+        if nodes[-1].pop(None, None) is None:
+            return
+        # prune the branch back to the first node still in use
+        for depth in range(len(labels) - 1, -1, -1):
+            if nodes[depth + 1]:
+                break
+            del nodes[depth][labels[depth]]
+
+    def _normal_hosts_insert(self, host: str):
+        if host.isascii() and host.islower():
+            return
+        key = _normalize_host(host)
+        if key == host:
+            return
+        found = self._normal_hosts.get(key)
+        if found is None:
+            self._normal_hosts[key] = host
+        else:
+            self._normal_hosts[key] = (found, host) if isinstance(found, str) else (*found, host)
+
+    def _normal_hosts_remove(self, host: str):
+        key = _normalize_host(host)
+        if key == host:
+            return
+        found = self._normal_hosts[key]
+        remaining = () if isinstance(found, str) else tuple(h for h in found if h != host)
+        if not remaining:
+            del self._normal_hosts[key]
+        else:
+            self._normal_hosts[key] = remaining[0] if len(remaining) == 1 else remaining
+
+    def _get_normal_hosts(self) -> dict:
+        # once built, it's kept up to date, and the whole file has been parsed
+        if self._normal_hosts is None:
+            self._load()
+            self._normal_hosts = {}
+            for host in self._hosts:
+                self._normal_hosts_insert(host)
+        return self._normal_hosts
+
+    def _spellings(self, host: str) -> tuple[str, ...]:
+        "The hosts in this hostfile which are `host`, ignoring case and IDNA encoding."
+        key = _normalize_host(host)
+        found = self._get_normal_hosts().get(key, ())
+        found = (found,) if isinstance(found, str) else found
+        return (key, *found) if key in self._hosts else found
+
+    def _get_trie(self) -> dict:
+        self._load()
+        if self._trie is None:
+            self._trie = {}
+            for host in self._hosts:
+                self._trie_insert(host)
+        return self._trie
+
+    def under(self, domain: str) -> list[str]:
+        """Returns the hosts which are subdomains of `domain`.
+
+        `under('localhost')` (or `under('*.localhost')`) gives every
+        `*.localhost` name, at any depth, but not `localhost` itself.
+        Names are compared ignoring case and IDNA encoding, and each is
+        given as first spelt in the file. The cost depends on how many
+        hosts are found, not the size of the file.
+        """
+        node = self._get_trie()
+        for label in reversed(_normalize_host(domain.removeprefix('*.')).split('.')):
+            node = node.get(label)
+            if node is None:
+                return []
+
+        results = []
+        stack = [child for label, child in node.items() if label is not None]
+        while stack:
+            node = stack.pop()
+            for label, child in node.items():
+                if label is None:
+                    results.append(child)
+                else:
+                    stack.append(child)
+        return results
+
+    def parents(self, hostname: str) -> list[str]:
+        """Returns the parent domains of `hostname` which are hosts in this hostfile.
+
+        Single-label names like `localhost` are left out, since browsers
+        won't scope cookies to them. These are plain membership tests, so
+        no index is built, and a lazy Hostfile only parses as far as it
+        needs to.
+        """
+        labels = hostname.split('.')
+        suffixes = ('.'.join(labels[start:]) for start in range(1, len(labels) - 1))
+        return [suffix for suffix in suffixes if suffix in self]
+
+    def conflicts(self, hostname: str) -> list[str]:
+        """Returns the other hosts which are a parent or subdomain of `hostname`.
+
+        Those can read or overwrite each other's cookies. Finding the
+        subdomains needs the whole file indexed; see `parents()` for a
+        check which doesn't.
+        """
+        return self.parents(hostname) + self.under(hostname)
+
+    def _get_ip_index(self) -> dict:
+        """Returns {IP version: (sorted packed addresses, matching IPs as written)}.
+
+        IPs which don't parse are left out.
+        """
+        self._load()
+        if self._ip_index is None:
+            families = {4: [], 6: []}
+            for ip in self._ips:
+                address = _parse_ip(ip)
+                if address is not None:
+                    families[address.version].append((address.packed, ip))
+            self._ip_index = {}
+            for version, entries in families.items():
+                entries.sort()
+                self._ip_index[version] = ([packed for packed, _ in entries], [ip for _, ip in entries])
+        return self._ip_index
+
+    def by_network(self, cidr: str) -> list[str]:
+        """Returns the hosts mapped to an IP in the network `cidr`, e.g. `10.0.0.0/8`.
+
+        IPs are compared by value, so `::ffff:10.1.2.3` is in `10.0.0.0/8`.
+        """
+        network = ipaddress.ip_network(cidr, strict=False)
+        packed, ips = self._get_ip_index()[network.version]
+        start = bisect_left(packed, network.network_address.packed)
+        end = bisect_right(packed, network.broadcast_address.packed)
+        hosts = {}
+        for ip in ips[start:end]:
+            hosts.update(self._ip_hosts[ip])
+        return list(hosts)
+
+    def ipv4(self) -> list[str]:
+        "Returns the hosts mapped to an IPv4 address."
+        return self.by_network('0.0.0.0/0')
+
+    def ipv6(self) -> list[str]:
+        "Returns the hosts mapped to an IPv6 (and not IPv4-mapped) address."
+        return self.by_network('::/0')
+
+    def loopback_hosts(self) -> list[str]:
+        "Returns the hosts mapped to a loopback address."
+        return list(dict.fromkeys(self.by_network('127.0.0.0/8') + self.by_network('::1/128')))
+
+    def is_loopback(self, host: str, *, parsed_only: bool = False) -> bool:
+        "True if `host` is in this hostfile and all of its IPs are loopback addresses. See `resolve()` for `parsed_only`."
+        ips = self.resolve(host, parsed_only=parsed_only)
+        return bool(ips) and all(
+            (address := _parse_ip(ip)) is not None and address.is_loopback
+            for ip in ips
+        )
+
+    def add(self, ip: str, *hosts: str):
+        """Add a line mapping `ip` to `hosts`, as if it were at the end of the file.
+
+        Only the new line is indexed, so this doesn't depend on the size
+        of the hostfile. Formatting the hostfile includes the new line.
+        """
+        _check_entry(ip, hosts)
+        self._load()
+        self._edited = True
+        # a line emptied by remove() is '', and needs no line ending
+        if self._contents and self._contents[-1] and not self._contents[-1].endswith(('\n', '\r')):
+            self._contents[-1] += '\n'
+        self._contents.append(f"{ip}\t{' '.join(hosts)}\n")
+        self._index_entry(ip, list(hosts))
+
+    def remove(self, host: str):
+        """Remove `host`, in any spelling, from every line it appears on.
+
+        Other hosts on those lines are kept; a line left with no hosts is
+        dropped from the output, but line numbers don't change. Raises
+        KeyError if `host` isn't in this hostfile.
+        """
+        spellings = self._spellings(host)
+        if not spellings:
+            raise KeyError(host)
+        self._edited = True
+        for spelling in spellings:
+            self._remove_spelling(spelling)
+
+    def _remove_spelling(self, host: str):
+        "Remove `host`, spelt exactly so, from the indexes and its lines."
+        entry = self._hosts.pop(host)
+        # before the line -> IP table changes
+        host_ips = self._entry_ips(entry)
+        for line in dict.fromkeys(self._entry_lines(entry)):
+            idx = line - 1
+            ip = self._line_ips[idx]
+            line_hosts = self._line_hosts[idx]
+            remaining = tuple(h for h in ((line_hosts,) if isinstance(line_hosts, str) else line_hosts) if h != host)
+            if remaining:
+                self._line_hosts[idx] = remaining[0] if len(remaining) == 1 else remaining
+                self._contents[idx] = f"{self._format_entry(idx)}\n"
+                continue
+            self._line_ips[idx] = self._line_hosts[idx] = None
+            self._line_comments.pop(idx, None)
+            self._contents[idx] = ''
+            dropped = self._dropped_lines.get(ip, 0) + 1
+            if dropped < len(self._ips[ip]):
+                self._dropped_lines[ip] = dropped
+            else:
+                del self._ips[ip]
+                self._dropped_lines.pop(ip, None)
+                self._ip_index = None
+        for ip in host_ips:
+            ip_hosts = self._ip_hosts[ip]
+            del ip_hosts[host]
+            if not ip_hosts:
+                del self._ip_hosts[ip]
+        if self._trie is not None:
+            self._trie_remove(host)
+        # remove() built it to find the spellings
+        self._normal_hosts_remove(host)
+
+    def set(self, host: str, ip: str):
+        "Make `ip` the only IP for `host`, removing it from any other lines."
+        self._load()
+        if self.resolve(host) == [ip]:
+            return
+        if host in self:
+            self.remove(host)
+        self.add(ip, host)
+
     def __getitem__(self, key):
-        "Returns a list of lines where this host is defined."
-        return self._hosts[key]
+        "Returns a list of lines where this host is defined, in any spelling."
+        spellings = self._spellings(key)
+        if not spellings:
+            raise KeyError(key)
+        if len(spellings) == 1:
+            return self._entry_lines(self._hosts[spellings[0]])
+        return sorted(set(chain.from_iterable(self._entry_lines(self._hosts[host]) for host in spellings)))
+
+    def _entry_lines(self, entry: int|_HostRecord) -> list[int]:
+        if type(entry) is int:
+            return [entry]
+        return entry.lines.tolist()
+
+    def _entry_ips(self, entry: int|_HostRecord) -> list[str]:
+        if type(entry) is int:
+            return [self._line_ips[entry-1]]
+        return list(entry.ips)
     
     def __iter__(self):
         "Returns an iterable of the hostnames in this hostfile"
+        self._load()
         return iter(self._hosts)
 
     def __len__(self):
         "Return how many hosts are in this hostfile"
+        self._load()
         return len(self._hosts)
     
     def ip_on_line(self, line: int):
+        self._load()
         if line > len(self._contents):
             raise ValueError(f'line should be {len(self._contents)} or less')
         if line <= 0:
             raise ValueError('line must be 1 or greater')
 
-        for ip, all_lines in self._ips.items():
-            for haystack_line in all_lines:
-                if haystack_line == line:
-                    return ip
+        return self._line_ips[line-1]
+
+    def resolve(self, host: str, *, parsed_only: bool = False) -> list[str]:
+        """Returns the IPs this host maps to, in any spelling, in the order they appear.
+
+        With `parsed_only=True`, a host already seen spelt exactly as given
+        is answered from the lines parsed so far, without parsing the rest
+        or looking for other spellings. That suits a lazy Hostfile which
+        has just found `host` with `in`.
+        """
+        if parsed_only and host in self._hosts:
+            return self._entry_ips(self._hosts[host])
+        spellings = self._spellings(host)
+        if not spellings:
+            return []
+        if len(spellings) == 1:
+            return self._entry_ips(self._hosts[spellings[0]])
+        return list(dict.fromkeys(self._line_ips[line - 1] for line in self[host]))
+
+    def hosts_for(self, ip: str) -> list[str]:
+        "Returns the hosts mapped to this IP, in the order they appear."
+        self._load()
+        if ip not in self._ip_hosts:
+            return []
+        return list(self._ip_hosts[ip])
     
     def __format__(self, format_spec):
         """Returns a printable hostfile.
@@ -60,54 +1193,198 @@ class Hostfile(Mapping):
         - clean - one line per line of the original, but cleaned up a bit (default)
         - simple - one line per unique IP address, strip comments
         """
+        self._load()
+        with _phase(self._timings, 'format'):
+            if format_spec == 'raw':
+                return str(self)
+            return '\n'.join(self.iter_format(format_spec))
+
+    def iter_format(self, format_spec: str = 'clean') -> Iterator[str]:
+        """Yield the lines of `format(self, format_spec)` one at a time.
+
+        Lines come without line endings, except in `raw` format where
+        they're exactly as read.
+        """
         match format_spec:
             case 'raw':
-                return str(self)
+                self._load()
+                return iter(self._contents)
             case 'clean' | '' | None:
-                return self._format_clean()
+                self._load()
+                return self._iter_clean()
             case 'simple':
-                return self._format_simple()
+                self._load()
+                return self._iter_simple()
             case _:
                 raise ValueError('format_spec not recognized')
 
-    def _format_clean(self):
-        results = []
+    def write_to(self, stream: IO, format_spec: str = 'clean'):
+        "Write the hostfile to `stream` in the given format, a line at a time."
+        # parse first, so that doesn't count as formatting
+        self._load()
+        with _phase(self._timings, 'format'):
+            lines = self.iter_format(format_spec)
+            if format_spec == 'raw':
+                stream.writelines(lines)
+            else:
+                stream.writelines(f"{line}\n" for line in lines)
 
-        for line in self._contents:
-            line = line.strip()
-            # skip blank lines
-            if len(line) == 0:
-                continue
-            # emit comments as-is
-            if line[0] == '#':
-                results.append(line)
+    def _host_list(self, idx: int) -> str:
+        "The hosts on line `idx` (counting from 0), space-separated."
+        hosts = self._line_hosts[idx]
+        return hosts if isinstance(hosts, str) else ' '.join(hosts)
+
+    def _format_entry(self, idx: int) -> str:
+        "Line `idx` (counting from 0) as `IP<tab>hosts`, plus its inline comment."
+        entry = f"{self._line_ips[idx]}\t{self._host_list(idx)}"
+        comment = self._line_comments.get(idx)
+        return entry if comment is None else f"{entry}\t# {comment}"
+
+    def _iter_clean(self):
+        comments = self._line_comments
+        for idx, ip in enumerate(self._line_ips):
+            if ip is not None:
+                yield self._format_entry(idx) if idx in comments else f"{ip}\t{self._host_list(idx)}"
                 continue
-            # otherwise this is a normal line
-            ip, rest = line.split(maxsplit=1)
-            hosts = rest.split()
-            results.append(f"{ip}\t{' '.join(hosts)}")
-        
-        return '\n'.join(results)
+            # emit comments as-is, skip blank lines
+            line = self._contents[idx].strip()
+            if line:
+                yield line
 
-    def _format_simple(self):
-        results = ['# simplified to one line per IP']
+    def _iter_simple(self):
+        yield '# simplified to one line per IP'
 
-        for ip, host_lines in self._ips.items():
-            hosts = []
-            for host_line in host_lines:
-                _, raw_hosts = self._contents[host_line-1].strip().split()
-                hosts.extend(raw_hosts.split())
-            results.append(f"{ip}\t{' '.join(hosts)}")
-        
-        return '\n'.join(results)
+        for ip in self._ips:
+            yield f"{ip}\t{' '.join(self._host_list(line - 1) for line in self._ip_lines(ip))}"
+
+    def _ip_lines(self, ip: str) -> array:
+        "The lines `ip` is on, less any remove() has emptied."
+        lines = self._ips[ip]
+        if ip not in self._dropped_lines:
+            return lines
+        return array('I', (line for line in lines if self._line_ips[line - 1] is not None))
 
     def __str__(self):
+        self._load()
         return ''.join(self._contents)
     
     def __repr__(self):
+        self._load()
         return f"<{self.__class__.__name__}: {len(self._contents)} lines, {len(self._ips)} unique IPs, {len(self._hosts)} unique hosts>"
 
 
+class HostfileMembership(Container):
+    """Only answers whether hostnames are in a hostfile, in bounded memory.
+
+    Instead of `Hostfile`'s indexes, this keeps one sorted 64-bit key per
+    hostname: a short hash of its normalized name (see `_normalize_host()`)
+    above the byte offset of the line it's on. A lookup bisects for the hash, then re-reads each candidate
+    line to confirm the name is really on it, so hash collisions cost a
+    little time but never give a wrong answer. That's 8 bytes a hostname,
+    which suits blocklist hostfiles with millions of entries.
+    """
+    # key = hash << _OFFSET_BITS | line offset
+    _OFFSET_BITS = 40
+    _OFFSET_MASK = (1 << _OFFSET_BITS) - 1
+    _HASH_MASK = (1 << (64 - _OFFSET_BITS)) - 1
+    # keys are sorted in runs of this many, then merged
+    _RUN_LENGTH = 1 << 16
+
+    def __init__(self, buf: bytes):
+        "Index a hostfile's contents, which must stay unchanged while in use."
+        if len(buf) >> self._OFFSET_BITS:
+            raise ValueError("hostfile is too large to index")
+        self._path = None
+        self._buf = buf
+        self._keys = self._build_keys(buf)
+
+    @classmethod
+    def from_path(cls, path: str|PathLike):
+        "Index the hostfile at `path` by memory-mapping it."
+        buf, st = _map_file(path)
+        if _compression(buf) is not None:
+            raise ValueError("compressed hostfiles can't be indexed by line offset")
+        if _has_lone_cr(buf):
+            raise ValueError("hostfiles with lines ending in a bare CR can't be indexed by line offset")
+        self = cls(buf)
+        self._path = path
+        self._stat_key = _stat_key(st)
+        return self
+
+    @classmethod
+    def _build_keys(cls, buf) -> array:
+        runs = []
+        run = []
+        start = 0
+        for end, fields, _ in _tokenize_buffer(buf, 0, len(buf)):
+            for host in fields[1:]:
+                if not (host.isascii() and host.islower()):
+                    host = _normalize_host(host)
+                run.append((hash(host) & cls._HASH_MASK) << cls._OFFSET_BITS | start)
+            if len(run) >= cls._RUN_LENGTH:
+                run.sort()
+                runs.append(array('Q', run))
+                run = []
+            start = end
+        run.sort()
+        runs.append(array('Q', run))
+        if len(runs) == 1:
+            return runs[0]
+        return array('Q', heapq.merge(*runs))
+
+    def _hosts_on_line(self, offset: int) -> list[str]:
+        end = self._buf.find(b'\n', offset)
+        line = self._buf[offset:None if end == -1 else end].decode('utf-8', 'surrogateescape')
+        fields, _ = _tokenize_line(line)
+        return [_normalize_host(host) for host in fields[1:]]
+
+    def __contains__(self, x):
+        "Check if a given host is present in this hostfile, ignoring case"
+        if not isinstance(x, str):
+            return False
+        x = _normalize_host(x)
+        low = (hash(x) & self._HASH_MASK) << self._OFFSET_BITS
+        high = low + (1 << self._OFFSET_BITS)
+        keys = self._keys
+        for idx in range(bisect_left(keys, low), bisect_left(keys, high)):
+            if x in self._hosts_on_line(keys[idx] & self._OFFSET_MASK):
+                return True
+        return False
+
+    def contains_many(self, hosts: Iterable[str]) -> Iterator[tuple[str, bool]]:
+        "Check several hosts, yielding (host, present) pairs."
+        for host in hosts:
+            yield host, host in self
+
+    def missing(self, hosts: Iterable[str]) -> list[str]:
+        "Returns the hosts which aren't in this hostfile, in the order given."
+        return [host for host, found in self.contains_many(hosts) if not found]
+
+    def __len__(self):
+        "The number of hostname entries, counting repeats."
+        return len(self._keys)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}: {len(self._keys)} hostname entries>"
+
+
+def _parse_chunk(path: str|PathLike, start: int, stop: int, first_line: int) -> bytes:
+    """Parse bytes `start:stop` of the hostfile at `path`, numbering lines from `first_line`.
+
+    Runs in a worker process for `Hostfile.from_path(workers=...)`, and
+    returns the chunk's marshalled `_get_state()`.
+    """
+    buf, _ = _map_file(path)
+    chunk = Hostfile.__new__(Hostfile)
+    chunk._path = None
+    chunk._timings = None
+    contents = _MappedLines(buf)
+    contents._offsets[0] = start
+    chunk._setup(contents, chunk._index_buffer(buf, contents, start, stop), lazy=False)
+    chunk._shift_lines(first_line - 1)
+    return marshal.dumps(chunk._get_state())
+
+
 if __name__ == '__main__':
     hosts = """##
 # Host Database
@@ -136,5 +1413,5 @@ if __name__ == '__main__':
 
     for h in hf:
         print(h)
-        for l in hf[h]:
-            print('  ', hf.ip_on_line(l))
+        for ip in hf.resolve(h):
+            print('  ', ip)
@@ -0,0 +1,98 @@
+"""
+Noticing when a hostfile changes.
+
+On Linux this uses inotify (through ctypes, so there's nothing to
+install), watching the hostfile's directory so that editors which
+replace the file rather than writing to it are noticed too. Anywhere
+else, or if inotify can't be set up, the file's stat is polled.
+"""
+import ctypes
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+import time
+from typing import Iterator
+
+from runserveronhostname.hostfile_parser import _stat_key
+
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+# struct inotify_event, up to its variable-length name
+_EVENT = struct.Struct('iIII')
+
+
+def changes(path: str|os.PathLike, interval: float = 1.0) -> Iterator[None]:
+    """Yield each time the file at `path` may have changed. Never finishes.
+
+    A yield doesn't promise a change (`Hostfile.refresh()` will tell), but
+    no change goes unreported. `interval` is how often to poll, when
+    polling.
+    """
+    fd = _inotify(path)
+    if fd is None:
+        yield from _poll(path, interval)
+    else:
+        try:
+            yield from _inotify_events(fd, os.fsencode(Path(path).name))
+        finally:
+            os.close(fd)
+
+
+def _inotify(path: str|os.PathLike) -> int|None:
+    "An inotify descriptor watching `path`'s directory, or None if that isn't possible."
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    directory = os.fsencode(Path(path).absolute().parent)
+    if libc.inotify_add_watch(fd, directory, _WATCH_MASK) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _inotify_events(fd: int, name: bytes) -> Iterator[None]:
+    while True:
+        select.select([fd], [], [])
+        buf = os.read(fd, 65536)
+        # one read can hold many events; only say something once
+        offset, touched = 0, False
+        while offset < len(buf):
+            _, _, _, length = _EVENT.unpack_from(buf, offset)
+            offset += _EVENT.size
+            touched |= buf[offset:offset+length].rstrip(b'\0') == name
+            offset += length
+        if touched:
+            yield
+
+
+def _poll(path: str|os.PathLike, interval: float) -> Iterator[None]:
+    last = _current_key(path)
+    while True:
+        time.sleep(interval)
+        key = _current_key(path)
+        if key != last:
+            last = key
+            yield
+
+
+def _current_key(path: str|os.PathLike) -> tuple|None:
+    try:
+        return _stat_key(os.stat(path))
+    except OSError:
+        return None
@@ -0,0 +1,114 @@
+"""
+Helpers for changing a hostfile on disk.
+"""
+import os
+from pathlib import Path
+import stat
+import tempfile
+
+from runserveronhostname.hostfile_parser import Hostfile, _check_entry, _compression
+
+
+BLOCK_BEGIN = "# BEGIN runserveronhostname -- managed by `manage.py hostfile --sync`, edits will be lost"
+BLOCK_END = "# END runserveronhostname"
+
+
+def append_entry(path: str|os.PathLike, ip: str, *hosts: str):
+    """Append a single `ip hosts...` line to the hostfile at `path`.
+
+    Only the new line is written (plus a newline if the file didn't end
+    with one), so the cost doesn't depend on the size of the file. The
+    write is a single O_APPEND write followed by an fsync. Compressed
+    hostfiles can't be appended to this way, and raise ValueError, as do
+    an IP or hosts which wouldn't read back as written.
+    """
+    _check_entry(ip, hosts)
+    line = f"{ip}\t{' '.join(hosts)}\n".encode()
+    with open(path, 'ab') as f:
+        if f.tell() > 0:
+            with open(path, 'rb') as existing:
+                _refuse_compressed(path, existing.read(6))
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b'\n':
+                    line = b'\n' + line
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _refuse_compressed(path: str|os.PathLike, head: bytes):
+    if _compression(head) is not None:
+        raise ValueError(f"{path} is compressed; decompress it to edit it")
+
+
+def write_atomic(path: str|os.PathLike, data: bytes):
+    """Replace the file at `path` with `data`, atomically.
+
+    The data goes to a temporary file in the same directory, which is
+    fsynced and renamed over the original, so readers see either the old
+    file or the new one. Permissions, and the owner where allowed, are
+    carried over. If `path` is a symlink, the file it points to is
+    replaced and the link left alone.
+    """
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    st = os.stat(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.runserveronhostname-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, stat.S_IMODE(st.st_mode))
+        if hasattr(os, 'chown'):
+            try:
+                os.chown(tmp, st.st_uid, st.st_gid)
+            except PermissionError:
+                pass
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    # make the rename itself durable
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def sync_managed_block(path: str|os.PathLike, hostnames: list[str], ip: str = '127.0.0.1') -> bool:
+    """Make the hostfile's managed block map exactly `hostnames` to `ip`.
+
+    Names already defined elsewhere in the file are left out of the
+    block, and an empty block is removed. The file is read once and, only
+    if its contents would change, rewritten atomically. Returns whether
+    it was rewritten. Compressed hostfiles raise ValueError.
+    """
+    data = Path(path).read_bytes()
+    _refuse_compressed(path, data)
+    original = data.decode('utf-8', 'surrogateescape')
+    lines = original.splitlines(keepends=True)
+    before, after = lines, []
+    stripped = [line.strip() for line in lines]
+    if BLOCK_BEGIN in stripped:
+        begin = stripped.index(BLOCK_BEGIN)
+        try:
+            end = stripped.index(BLOCK_END, begin)
+        except ValueError:
+            raise ValueError(f"{path} has a managed block with no end marker") from None
+        before, after = lines[:begin], lines[end+1:]
+
+    outside = Hostfile(''.join(before + after), lazy=True)
+    names = sorted(set(outside.missing(hostnames)))
+    block = []
+    if names:
+        block = [f"{BLOCK_BEGIN}\n", *(f"{ip}\t{name}\n" for name in names), f"{BLOCK_END}\n"]
+        if before and not before[-1].endswith('\n'):
+            before[-1] += '\n'
+
+    updated = ''.join(before + block + after)
+    if updated == original:
+        return False
+    write_atomic(path, updated.encode('utf-8', 'surrogateescape'))
+    return True
@@ -1,14 +1,102 @@
+import ipaddress
+import os
+import socket
+
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+
+
+# "<hostname> <IP version> <address>", set by the first runserver process
+# to resolve RUNSERVER_ON and inherited by the autoreloader's child processes
+RESOLVED_ENV = 'RUNSERVERONHOSTNAME_RESOLVED'
+
+
+def resolve(host: str, family: int = socket.AF_INET) -> str:
+    """Return the address `host` will be served on, for `family` (AF_INET or AF_INET6).
+
+    The hostfile is asked first, then DNS, and only addresses of `family`
+    count, as runserver won't bind to any other. The answer is kept in
+    the environment, so processes restarted by the autoreloader reuse it.
+    """
+    version = '6' if family == socket.AF_INET6 else '4'
+    cached = os.environ.get(RESOLVED_ENV, '').split(' ')
+    if len(cached) == 3 and cached[:2] == [host, version]:
+        return cached[2]
+    address = _from_hostfile(host, int(version)) or _from_dns(host, family)
+    os.environ[RESOLVED_ENV] = f"{host} {version} {address}"
+    return address
+
+
+def _from_hostfile(host: str, version: int) -> str|None:
+    # not imported until needed, as they take a few milliseconds
+    from runserveronhostname.checks import system_hostfile
+    from runserveronhostname.hostfile_cache import cached_resolve
+    from runserveronhostname.hostfile_parser import _parse_ip
+    hostfile = system_hostfile()
+    if hostfile is None:
+        return None
+    try:
+        addresses = cached_resolve(hostfile, host)
+    except OSError:
+        return None
+    for ip in addresses:
+        address = _parse_ip(ip)
+        if address is not None and address.version == version:
+            # IPv6 as written, to keep any scope ID
+            return str(address) if version == 4 else ip
+    return None
+
+
+def _from_dns(host: str, family: int) -> str:
+    try:
+        infos = socket.getaddrinfo(host, None, family=family, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise CommandError(
+            f"RUNSERVER_ON's hostname {host} doesn't resolve ({e.strerror}). "
+            "Add it to your hostfile with `manage.py hostfile --in-place`."
+        )
+    return infos[0][4][0]
+
+
+def check_port(address: str, port: int, family: int = socket.AF_INET):
+    "Raise CommandError unless a server could listen on `address`:`port` right now."
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            # as the dev server does, so a port in TIME_WAIT isn't taken
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((address, port))
+    except OSError as e:
+        raise CommandError(f"Can't listen on {address} port {port}: {e.strerror}.")
 
 
 class PartialRunserverCommand(BaseCommand):
+    # whether handle() filled addrport in from RUNSERVER_ON
+    _injected = False
+
     def handle(self, *args, **options):
         if not options["addrport"]:
             try:
                 run_on = settings.RUNSERVER_ON
                 if run_on:
                     options["addrport"] = run_on
+                    self._injected = True
             except AttributeError:
                 pass
         return super().handle(*args, **options)
+
+    def run(self, **options):
+        # runserver calls this once it has parsed addrport, and before the
+        # system checks and migration scan, so a bad RUNSERVER_ON fails fast
+        if self._injected:
+            self.preflight()
+        return super().run(**options)
+
+    def preflight(self):
+        "Check that RUNSERVER_ON's hostname resolves and its port is free."
+        # runserver binds with AF_INET unless it was given -6 or an IPv6 address
+        family = socket.AF_INET6 if self.use_ipv6 else socket.AF_INET
+        try:
+            address = str(ipaddress.ip_address(self.addr))
+        except ValueError:
+            address = resolve(self.addr, family)
+        check_port(address, int(self.port), family)
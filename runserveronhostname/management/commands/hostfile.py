@@ -1,10 +1,19 @@
+import io
+from itertools import chain
+import json
 from pathlib import Path
 import platform
+import sys
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
-from runserveronhostname.hostfile_parser import Hostfile
+from runserveronhostname.checks import runserver_on_hostname
+from runserveronhostname.hostfile_cache import load_hostfile
+from runserveronhostname.hostfile_parser import Hostfile, HostfileMembership, HostfileTimings
+from runserveronhostname.hostfile_watch import changes
+from runserveronhostname.hostfile_writer import append_entry, sync_managed_block
+from runserveronhostname.registry import read_registry, register
 
 
 class Command(BaseCommand):
@@ -16,6 +25,26 @@ class Command(BaseCommand):
             action="store_true",
             help="Print a hostfile with this project added",
         )
+        parser.add_argument(
+            "--in-place",
+            action="store_true",
+            help="Add this project to the hostfile itself, appending only its line",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Register this project, then rewrite the hostfile's managed block to list every registered project",
+        )
+        parser.add_argument(
+            "--registry",
+            action="store",
+            help="With --sync, the registry of project hostnames to use (default: ~/.config/runserveronhostname/projects)",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep running, printing hostname mappings as they're added to or removed from the hostfile",
+        )
         parser.add_argument(
             "--status",
             action="store_true",
@@ -24,42 +53,225 @@ class Command(BaseCommand):
         parser.add_argument(
             "--file",
             action="store",
-            help="Exit with 0 status if this project is already included, 1 if not",
+            help="Read this hostfile instead of the system one (gzip, bz2 and xz are decompressed on the fly)",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Parse the hostfile from scratch instead of using the on-disk index cache",
+        )
+        parser.add_argument(
+            "--low-memory",
+            action="store_true",
+            help="Only test membership, using a compact index, for very large hostfiles (skips the warnings; not with --write)",
+        )
+        parser.add_argument(
+            "--conflicts",
+            action="store_true",
+            help="Also warn about hostnames under this project's, which means indexing the whole hostfile",
+        )
+        parser.add_argument(
+            "--timings",
+            action="store_true",
+            help="Report time spent reading, tokenizing, indexing and formatting the hostfile, plus peak memory, on stderr",
+        )
+        parser.add_argument(
+            "--check",
+            nargs="+",
+            metavar="HOSTNAME",
+            help="Check these hostnames instead of this project's, printing one result per line",
+        )
+        parser.add_argument(
+            "--stdin",
+            action="store_true",
+            help="Check whitespace-separated hostnames read from standard input",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="With --check or --stdin, print each result as a line of JSON",
         )
 
     def handle(self, *args, **options):
+        self._timings = HostfileTimings() if options.get('timings') else None
+        if self._timings is None:
+            return self._handle(options)
+        try:
+            with self._timings.tracking_memory():
+                return self._handle(options)
+        finally:
+            self.stderr.write("Timings:")
+            for line in self._timings.report():
+                self.stderr.write(f"  {line}")
+
+    def _handle(self, options):
+        hostnames = options.get('check') or []
+        if options.get('stdin'):
+            hostnames = chain(hostnames, (name for line in sys.stdin for name in line.split()))
+        if hostnames:
+            hostfile = self._hostfile_path(options)
+            return self._check_many(self._load(hostfile, options), hostnames, hostfile, options)
+        if options.get('sync'):
+            return self._sync(self._hostfile_path(options), options)
+
         try:
             runserver_on = settings.RUNSERVER_ON
         except AttributeError:
             self.stdout.write("RUNSERVER_ON not found in settings.")
             return
         
-        target_hostname, _ = runserver_on.split(':', maxsplit=1)
+        target_hostname = runserver_on_hostname(runserver_on)
+        if target_hostname is None:
+            self.stdout.write(f"RUNSERVER_ON ({runserver_on}) has no hostname to look for in the hostfile.")
+            return
+
+        hostfile = self._hostfile_path(options)
+        write_hostfile = options['write']
+        if (write_hostfile or options.get('watch')) and options.get('low_memory'):
+            raise CommandError("--write and --watch need the whole hostfile; they can't be used with --low-memory", returncode=2)
+        hosts = self._load(hostfile, options)
+        if isinstance(hosts, Hostfile):
+            self._warn(hosts, target_hostname, hostfile, options)
+
+        if options.get('watch'):
+            return self._watch(hosts, target_hostname, hostfile)
+        if options.get('in_place'):
+            if target_hostname in hosts:
+                self.stdout.write(f"{target_hostname} is already in {hostfile}.")
+                return
+            try:
+                append_entry(hostfile, '127.0.0.1', target_hostname)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Couldn't add {target_hostname} to {hostfile}: {e}", returncode=2)
+            self.stdout.write(f"Added {target_hostname} to {hostfile}.")
+        elif write_hostfile:
+            if target_hostname not in hosts:
+                hosts.add('127.0.0.1', target_hostname)
+            self._write_raw(hosts)
+        else:
+            if target_hostname in hosts:
+                self.stdout.write(f"{target_hostname} is already in {hostfile}.")
+            else:
+                err_msg = f"{target_hostname} not found in {hostfile}."
+                if options['status']:
+                    raise CommandError(err_msg, returncode=1)
+                self.stderr.write(err_msg)
 
+    def _hostfile_path(self, options):
         system = platform.system()
         if options['file']:
-            hostfile = Path(options['file'])
+            return Path(options['file'])
         elif system in ('Darwin', 'Linux'):
-            hostfile = Path('/etc/hosts')
+            return Path('/etc/hosts')
         elif system in ('Windows',):
             raise CommandError("Windows has a known hostfile but we haven't dealt with it yet", returncode=2)
         else:
             raise CommandError(f'No implementation for {system}', returncode=2)
 
-        with open(hostfile) as f:
-            hosts = Hostfile(f)
+    def _write_raw(self, hosts):
+        "Print the hostfile as read, even bytes which aren't valid UTF-8."
+        buffer = getattr(self.stdout, 'buffer', None)
+        if buffer is None:
+            return hosts.write_to(self.stdout, 'raw')
+        # undecodable bytes were read as surrogates; write them back as bytes
+        self.stdout.flush()
+        out = io.TextIOWrapper(buffer, encoding='utf-8', errors='surrogateescape', newline='', write_through=True)
+        try:
+            hosts.write_to(out, 'raw')
+        finally:
+            out.detach()
 
-        write_hostfile = options['write']
+    def _load(self, hostfile, options):
+        if options.get('low_memory'):
+            try:
+                return HostfileMembership.from_path(hostfile)
+            except ValueError as e:
+                raise CommandError(f"Can't use --low-memory with {hostfile}: {e}", returncode=2)
+        if options.get('no_cache'):
+            # lazy parsing lets membership checks stop at the first match
+            return Hostfile.from_path(hostfile, lazy=True, timings=self._timings)
+        return load_hostfile(hostfile, self._timings)
 
-        if write_hostfile:
-            self.stdout.write(str(hosts))
-            if target_hostname not in hosts:
-                self.stdout.write(f"127.0.0.1\t{target_hostname}")
+    def _warn(self, hosts, target_hostname, hostfile, options):
+        # subdomains can only be found by indexing the whole file, so
+        # they're only looked for when asked
+        if options.get('conflicts'):
+            clashes = hosts.conflicts(target_hostname)
         else:
-            if target_hostname in hosts:
-                self.stdout.write(f"{target_hostname} is already in {hostfile}.")
+            clashes = hosts.parents(target_hostname)
+        if clashes:
+            self.stderr.write(
+                f"Warning: {target_hostname} can share cookies with {', '.join(clashes)} in {hostfile}."
+            )
+
+        # only as far as `in` had to parse, so a lazy hostfile stops early
+        if target_hostname in hosts and not hosts.is_loopback(target_hostname, parsed_only=True):
+            self.stderr.write(
+                f"Warning: {target_hostname} doesn't point at a loopback address in {hostfile} "
+                f"({', '.join(hosts.resolve(target_hostname, parsed_only=True))})."
+            )
+
+    def _watch(self, hosts, target_hostname, hostfile):
+        "Print what changes in the hostfile, until interrupted."
+        present = target_hostname in hosts
+        state = "is" if present else "is not"
+        self.stdout.write(f"Watching {hostfile} ({target_hostname} {state} in it). Press Ctrl-C to stop.")
+        self.stdout.flush()
+        try:
+            for _ in changes(hostfile):
+                try:
+                    diff = hosts.refresh_changes()
+                except OSError:
+                    # mid-replace, or deleted; the next change will tell
+                    continue
+                if diff is None:
+                    continue
+                added, removed = diff
+                for host, ip in removed:
+                    self.stdout.write(f"- {ip}\t{host}")
+                for host, ip in added:
+                    self.stdout.write(f"+ {ip}\t{host}")
+
+                now_present = target_hostname in hosts
+                if present and not now_present:
+                    self.stderr.write(f"Warning: {target_hostname} is no longer in {hostfile}.")
+                elif now_present and not present:
+                    self.stdout.write(f"{target_hostname} is back in {hostfile}.")
+                present = now_present
+                self.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+
+    def _sync(self, hostfile, options):
+        registry = options.get('registry')
+        runserver_on = getattr(settings, 'RUNSERVER_ON', None)
+        target_hostname = runserver_on_hostname(runserver_on) if runserver_on else None
+        if target_hostname is not None:
+            if register(target_hostname, registry):
+                self.stdout.write(f"Registered {target_hostname}.")
+
+        hostnames = read_registry(registry)
+        try:
+            changed = sync_managed_block(hostfile, hostnames)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Couldn't sync {hostfile}: {e}", returncode=2)
+        if changed:
+            self.stdout.write(f"Updated the managed block in {hostfile} ({len(hostnames)} registered hostnames).")
+        else:
+            self.stdout.write(f"{hostfile} is already up to date.")
+
+    def _check_many(self, hosts, hostnames, hostfile, options):
+        "Report on each hostname as soon as it's checked."
+        missing = 0
+        for hostname, found in hosts.contains_many(hostnames):
+            if options.get('json'):
+                self.stdout.write(json.dumps({'host': hostname, 'found': found}))
+            elif found:
+                self.stdout.write(f"{hostname} is already in {hostfile}.")
             else:
-                err_msg = f"{target_hostname} not found in {hostfile}."
-                if options['status']:
-                    raise CommandError(err_msg, returncode=1)
-                self.stderr.write(err_msg)
+                self.stdout.write(f"{hostname} not found in {hostfile}.")
+            self.stdout.flush()
+            missing += not found
+
+        if missing and options['status']:
+            raise CommandError(f"{missing} hostname(s) not found in {hostfile}.", returncode=1)
@@ -0,0 +1,35 @@
+"""
+A per-user registry of project hostnames, used by `hostfile --sync`.
+
+It's a plain text file with one hostname per line (blank lines and `#`
+comments are ignored), so it's easy to edit by hand.
+"""
+import os
+from pathlib import Path
+
+
+def registry_path() -> Path:
+    "Where the registry lives, honoring XDG_CONFIG_HOME."
+    base = os.environ.get('XDG_CONFIG_HOME') or Path.home() / '.config'
+    return Path(base) / 'runserveronhostname' / 'projects'
+
+
+def read_registry(path: str|os.PathLike|None = None) -> list[str]:
+    "Returns the registered hostnames, in the order they were added."
+    try:
+        text = Path(path or registry_path()).read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return []
+    names = (line.strip() for line in text.splitlines())
+    return list(dict.fromkeys(name for name in names if name and not name.startswith('#')))
+
+
+def register(hostname: str, path: str|os.PathLike|None = None) -> bool:
+    "Add `hostname` to the registry, returning False if it was already there."
+    path = Path(path or registry_path())
+    if hostname in read_registry(path):
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(f"{hostname}\n")
+    return True
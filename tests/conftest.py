@@ -7,6 +7,22 @@ from django.conf import settings
 from django.test import override_settings
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep the hostfile index cache out of the real home directory."""
+    cache_home = tmp_path / 'cache-home'
+    monkeypatch.setenv('XDG_CACHE_HOME', str(cache_home))
+    return cache_home / 'runserveronhostname'
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(tmp_path, monkeypatch):
+    """Keep the project registry out of the real home directory."""
+    config_home = tmp_path / 'config-home'
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(config_home))
+    return config_home / 'runserveronhostname' / 'projects'
+
+
 @pytest.fixture
 def mock_command():
     """Create a mock Django command instance."""
@@ -1,10 +1,15 @@
 """
 Tests for RunserveronhostnameConfig AppConfig class.
 """
+import os
+from pathlib import Path
+import subprocess
+import sys
 import pytest
 from unittest.mock import MagicMock, patch, Mock
 from importlib import import_module
 import django.core.management
+import runserveronhostname
 from runserveronhostname.apps import patched_load_command_class
 
 
@@ -112,3 +117,49 @@ class TestAppConfigReady:
             assert result == 'parent_result'
 
 
+# microseconds this package may add to every manage.py run, WSGI worker and
+# shell, on top of what Django's own setup imports anyway
+IMPORT_BUDGET_US = 5000
+
+# -X importtime only reports `import` statements, not importlib.import_module(),
+# which is how Django loads apps; so import the app's modules by hand first
+IMPORT_SCRIPT = """
+import sys
+import django.apps
+import django.core.management
+import runserveronhostname.apps
+from django.conf import settings
+settings.configure(INSTALLED_APPS=['runserveronhostname'])
+import django
+django.setup()
+print(' '.join(sorted(m for m in sys.modules if m.split('.')[0] == 'runserveronhostname')))
+"""
+
+
+class TestImportCost:
+    """Tests for what loading the app costs processes which never run runserver."""
+
+    def test_import_budget(self):
+        """Test that setting up the app stays within its import-time budget."""
+        env = dict(os.environ, PYTHONPATH=str(Path(runserveronhostname.__file__).parent.parent))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', IMPORT_SCRIPT],
+            capture_output=True, text=True, env=env, check=True,
+        )
+
+        # nothing beyond the app config until a command is loaded
+        assert result.stdout.split() == ['runserveronhostname', 'runserveronhostname.apps', 'runserveronhostname.checks']
+
+        total = 0
+        for line in result.stderr.splitlines():
+            # "import time: <self us> | <cumulative us> | <indented module name>"
+            fields = line.removeprefix('import time:').split('|')
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            # one space follows the bar, then two more per level of nesting
+            name = fields[2].rstrip().removeprefix(' ')
+            # only count modules imported directly by the script, which include their imports
+            if not name.startswith(' ') and name.split('.')[0] == 'runserveronhostname':
+                total += int(fields[1])
+        assert 0 < total < IMPORT_BUDGET_US, f"importing the app took {total} us"
+
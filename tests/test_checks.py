@@ -0,0 +1,96 @@
+"""
+Tests for the RUNSERVER_ON system check.
+"""
+from importlib import import_module
+from django.core import checks
+import django.core.management
+from django.test import override_settings
+import pytest
+from runserveronhostname import checks as app_checks, hostfile_cache
+from runserveronhostname.checks import check_runserver_on
+
+
+@pytest.fixture
+def hostfile(tmp_path, monkeypatch):
+    """Point the check at a hostfile of our own, on a platform it knows."""
+    p = tmp_path / "hosts"
+    p.write_text("127.0.0.1	localhost testproject.localhost\n10.0.0.1	remote.localhost\n", encoding="utf-8")
+    monkeypatch.setattr(app_checks, 'SYSTEM_HOSTFILE', str(p))
+    monkeypatch.setattr('sys.platform', 'linux')
+    return p
+
+
+class TestRunserverOnCheck:
+    """Test the system check for RUNSERVER_ON's hostname."""
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_found(self, hostfile):
+        """A loopback hostname in the hostfile passes."""
+        assert check_runserver_on(None) == []
+
+    @override_settings(RUNSERVER_ON='missing.localhost:8000')
+    def test_missing(self, hostfile):
+        """A hostname missing from the hostfile is a warning."""
+        warning, = check_runserver_on(None)
+        assert warning.id == 'runserveronhostname.W001'
+        assert warning.level == checks.WARNING
+        assert 'missing.localhost' in warning.msg
+        assert str(hostfile) in warning.msg
+
+    @override_settings(RUNSERVER_ON='remote.localhost:8000')
+    def test_not_loopback(self, hostfile):
+        """A hostname pointing elsewhere is a warning."""
+        warning, = check_runserver_on(None)
+        assert warning.id == 'runserveronhostname.W002'
+        assert '10.0.0.1' in warning.msg
+
+    @override_settings(RUNSERVER_ON='0.0.0.0:8000')
+    def test_address(self, hostfile):
+        """Binding to an address needs no hostfile entry."""
+        assert check_runserver_on(None) == []
+
+    @pytest.mark.parametrize('runserver_on', ['[::1]:8000', '8000', 'not an addrport'])
+    def test_no_hostname(self, hostfile, runserver_on):
+        """IPv6 addresses, bare ports and values runserver rejects have no hostname to check."""
+        with override_settings(RUNSERVER_ON=runserver_on):
+            assert check_runserver_on(None) == []
+
+    def test_without_setting(self, hostfile):
+        """Nothing to check without RUNSERVER_ON."""
+        assert check_runserver_on(None) == []
+
+    @override_settings(RUNSERVER_ON='missing.localhost:8000')
+    def test_other_platforms(self, hostfile, monkeypatch):
+        """Only platforms with a known hostfile are checked."""
+        monkeypatch.setattr('sys.platform', 'win32')
+        assert check_runserver_on(None) == []
+
+    @override_settings(RUNSERVER_ON='missing.localhost:8000')
+    def test_unreadable_hostfile(self, hostfile):
+        """A missing hostfile isn't this check's business."""
+        hostfile.unlink()
+        assert check_runserver_on(None) == []
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_cached(self, hostfile, monkeypatch):
+        """An unchanged hostfile isn't parsed again, and a changed one is."""
+        assert check_runserver_on(None) == []
+
+        def fail(*args, **kwargs):
+            raise AssertionError("should have been answered from the cache")
+        with monkeypatch.context() as m:
+            m.setattr(hostfile_cache, 'load_hostfile', fail)
+            assert check_runserver_on(None) == []
+
+        hostfile.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+        warning, = check_runserver_on(None)
+        assert warning.id == 'runserveronhostname.W001'
+
+    def test_registered(self, monkeypatch):
+        """ready() registers the check."""
+        # ready() patches this too; put it back afterwards
+        monkeypatch.setattr(django.core.management, 'load_command_class', django.core.management.load_command_class)
+        from runserveronhostname.apps import RunserveronhostnameConfig
+        config = RunserveronhostnameConfig('runserveronhostname', import_module('runserveronhostname'))
+        config.ready()
+        assert check_runserver_on in checks.registry.registry.get_checks()
@@ -0,0 +1,177 @@
+"""
+Tests for the hostfile index cache.
+"""
+import gzip
+from runserveronhostname import hostfile_cache, hostfile_parser
+from runserveronhostname.hostfile_cache import cache_dir, cached_resolve, load_hostfile
+from runserveronhostname.hostfile_parser import Hostfile, HostfileTimings
+
+
+HOSTS = """# comment
+127.0.0.1	localhost
+127.0.0.1       test.localhost
+::1             localhost
+10.0.0.1	other other.localhost  # the other one
+"""
+
+
+class TestHostfileCache:
+    """Test the on-disk cache of parsed hostfiles."""
+
+    def test_cache_dir(self, isolated_cache_dir, monkeypatch):
+        """The cache honors XDG_CACHE_HOME and falls back to ~/.cache."""
+        assert cache_dir() == isolated_cache_dir
+
+        monkeypatch.delenv('XDG_CACHE_HOME')
+        assert cache_dir().parent.name == '.cache'
+
+    def test_round_trip(self, tmp_path, isolated_cache_dir):
+        """A cache hit gives back the same Hostfile a fresh parse would."""
+        p = tmp_path / "hosts"
+        p.write_text(HOSTS, encoding="utf-8")
+
+        first = load_hostfile(p)
+        assert len(list(isolated_cache_dir.iterdir())) == 1
+        second = load_hostfile(p)
+        expected = Hostfile(HOSTS)
+
+        for hf in (first, second):
+            assert list(hf) == list(expected)
+            assert hf['localhost'] == [2, 4]
+            assert hf.resolve('localhost') == ['127.0.0.1', '::1']
+            assert hf.hosts_for('10.0.0.1') == ['other', 'other.localhost']
+            assert hf.ip_on_line(5) == '10.0.0.1'
+            assert str(hf) == HOSTS
+            assert format(hf, 'clean') == format(expected, 'clean')
+            assert format(hf, 'simple') == format(expected, 'simple')
+
+    def test_cache_hit_skips_parsing(self, tmp_path, monkeypatch):
+        """An unchanged file isn't parsed again."""
+        p = tmp_path / "hosts"
+        p.write_text(HOSTS, encoding="utf-8")
+        load_hostfile(p)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("should have been a cache hit")
+        monkeypatch.setattr(Hostfile, 'from_path', fail)
+
+        hf = load_hostfile(p)
+        assert 'test.localhost' in hf
+        # the normalized index is cached too
+        assert hf._normal_hosts is not None
+        assert hf['LocalHost'] == [2, 4]
+
+    def test_invalidated_by_changes(self, tmp_path):
+        """Editing the file invalidates its entry."""
+        p = tmp_path / "hosts"
+        p.write_text(HOSTS, encoding="utf-8")
+        assert 'new.localhost' not in load_hostfile(p)
+
+        p.write_text(HOSTS + "127.0.0.1 new.localhost\n", encoding="utf-8")
+        assert 'new.localhost' in load_hostfile(p)
+
+    def test_changed_while_loading(self, tmp_path, monkeypatch):
+        """A file edited between checking the entry and mapping the file is parsed afresh."""
+        p = tmp_path / "hosts"
+        p.write_text(HOSTS, encoding="utf-8")
+        load_hostfile(p)
+
+        map_file = hostfile_parser._map_file
+        def edit_then_map(path):
+            p.write_text(HOSTS + "127.0.0.1 new.localhost\n", encoding="utf-8")
+            return map_file(path)
+        monkeypatch.setattr(hostfile_parser, '_map_file', edit_then_map)
+
+        hf = load_hostfile(p)
+        assert 'new.localhost' in hf
+        assert str(hf) == p.read_text(encoding="utf-8")
+
+    def test_corrupt_entry(self, tmp_path, isolated_cache_dir):
+        """A damaged entry is treated as a miss and rewritten."""
+        p = tmp_path / "hosts"
+        p.write_text(HOSTS, encoding="utf-8")
+        load_hostfile(p)
+        entry, = isolated_cache_dir.iterdir()
+        entry.write_bytes(b'garbage')
+
+        assert 'test.localhost' in load_hostfile(p)
+        assert entry.read_bytes() != b'garbage'
+
+    def test_unwritable_cache(self, tmp_path, isolated_cache_dir, monkeypatch):
+        """Failing to write the cache isn't fatal."""
+        p = tmp_path / "hosts"
+        p.write_text(HOSTS, encoding="utf-8")
+
+        # the cache directory can't be created
+        isolated_cache_dir.parent.mkdir(parents=True)
+        isolated_cache_dir.write_text('not a directory')
+        assert 'test.localhost' in load_hostfile(p)
+
+        # the entry can't be moved into place
+        isolated_cache_dir.unlink()
+        def fail(*args):
+            raise OSError
+        monkeypatch.setattr(hostfile_cache.os, 'replace', fail)
+        assert 'test.localhost' in load_hostfile(p)
+        assert list(isolated_cache_dir.iterdir()) == []
+
+    def test_cached_resolve(self, tmp_path, isolated_cache_dir, monkeypatch):
+        """Answers are remembered per host until the file changes."""
+        p = tmp_path / "hosts"
+        p.write_text(HOSTS, encoding="utf-8")
+        assert cached_resolve(p, 'localhost') == ['127.0.0.1', '::1']
+        assert cached_resolve(p, 'missing.localhost') == []
+
+        def fail(*args, **kwargs):
+            raise AssertionError("should have been answered from the cache")
+        with monkeypatch.context() as m:
+            m.setattr(hostfile_cache, 'load_hostfile', fail)
+            assert cached_resolve(p, 'localhost') == ['127.0.0.1', '::1']
+            assert cached_resolve(p, 'missing.localhost') == []
+
+        p.write_text(HOSTS + "127.0.0.1 missing.localhost\n", encoding="utf-8")
+        assert cached_resolve(p, 'missing.localhost') == ['127.0.0.1']
+
+        # a damaged answer file is ignored and rewritten
+        answers, = isolated_cache_dir.glob('*.hosts')
+        answers.write_bytes(b'garbage')
+        assert cached_resolve(p, 'Other.localhost') == ['10.0.0.1']
+
+    def test_refresh_cached(self, tmp_path):
+        """A Hostfile from the cache can be refreshed."""
+        p = tmp_path / "hosts"
+        p.write_text(HOSTS, encoding="utf-8")
+        load_hostfile(p)
+        hf = load_hostfile(p)
+
+        with open(p, 'a', encoding="utf-8") as f:
+            f.write("127.0.0.1 new.localhost\n")
+
+        assert hf.refresh() is True
+        assert hf['new.localhost'] == [6]
+
+    def test_compressed_not_cached(self, tmp_path, isolated_cache_dir):
+        """Compressed hostfiles are parsed each time, and nothing is cached."""
+        p = tmp_path / "hosts.gz"
+        p.write_bytes(gzip.compress(HOSTS.encode()))
+
+        hf = load_hostfile(p)
+        assert hf['localhost'] == [2, 4]
+        assert not isolated_cache_dir.exists() or not any(isolated_cache_dir.iterdir())
+
+    def test_timings(self, tmp_path):
+        """Timings record cache misses and hits, and the time they took."""
+        p = tmp_path / "hosts"
+        p.write_text(HOSTS, encoding="utf-8")
+
+        miss = HostfileTimings()
+        load_hostfile(p, miss)
+        assert miss.cache == 'miss'
+        assert {'cache', 'read', 'tokenize', 'index'} <= set(miss.phases)
+
+        hit = HostfileTimings()
+        hf = load_hostfile(p, hit)
+        assert hit.cache == 'hit'
+        assert set(hit.phases) == {'cache'}
+        format(hf, 'clean')
+        assert set(hit.phases) == {'cache', 'format'}
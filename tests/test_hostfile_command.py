@@ -1,6 +1,9 @@
 """
 Tests for hostfile command.
 """
+import gzip
+from io import StringIO
+import json
 from django.test import override_settings
 from django.core.management import CommandError
 import pytest
@@ -11,6 +14,17 @@ CMD_DEFAULTS = {
     'write': False,
     'status': False,
     'file': None,
+    'no_cache': False,
+    'check': None,
+    'stdin': False,
+    'json': False,
+    'in_place': False,
+    'sync': False,
+    'registry': None,
+    'low_memory': False,
+    'watch': False,
+    'timings': False,
+    'conflicts': False,
 }
 
 class TestHostfileCommand:
@@ -157,3 +171,424 @@ class TestHostfileCommand:
         command = Command()
         with pytest.raises(CommandError):
             command.handle(**CMD_DEFAULTS)
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_no_cache(self, capsys, tmp_path, isolated_cache_dir):
+        """--no-cache parses the file directly and leaves the cache alone."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	testproject.localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), no_cache=True)
+        command.handle(**options)
+
+        captured = capsys.readouterr()
+        assert 'already in' in captured.out
+        assert not isolated_cache_dir.exists()
+
+    def test_check_many(self, capsys, tmp_path):
+        """--check reports on each hostname without needing RUNSERVER_ON."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	a.localhost b.localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), check=['a.localhost', 'c.localhost', 'b.localhost'])
+        command.handle(**options)
+
+        lines = capsys.readouterr().out.splitlines()
+        assert lines == [
+            f"a.localhost is already in {p}.",
+            f"c.localhost not found in {p}.",
+            f"b.localhost is already in {p}.",
+        ]
+
+    def test_check_many_json_stdin(self, capsys, tmp_path, monkeypatch):
+        """--stdin reads hostnames and --json prints a JSON object per line."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	a.localhost b.localhost\n", encoding="utf-8")
+        monkeypatch.setattr('sys.stdin', StringIO("b.localhost\n\nc.localhost d.localhost\n"))
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), check=['a.localhost'], stdin=True, json=True, no_cache=True)
+        command.handle(**options)
+
+        lines = capsys.readouterr().out.splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {'host': 'a.localhost', 'found': True},
+            {'host': 'b.localhost', 'found': True},
+            {'host': 'c.localhost', 'found': False},
+            {'host': 'd.localhost', 'found': False},
+        ]
+
+    def test_check_many_status(self, tmp_path):
+        """--status fails if any checked hostname is missing."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	a.localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), status=True, check=['a.localhost'])
+        assert command.handle(**options) is None
+
+        options.update(check=['a.localhost', 'c.localhost'])
+        with pytest.raises(CommandError) as excinfo:
+            command.handle(**options)
+        assert excinfo.value.returncode == 1
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_low_memory(self, capsys, tmp_path):
+        """--low-memory only checks membership, without the warnings."""
+
+        p = tmp_path / "hosts"
+        p.write_text("10.0.0.1	testproject.localhost localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), status=True, low_memory=True)
+        command.handle(**options)
+
+        captured = capsys.readouterr()
+        assert captured.out == f"testproject.localhost is already in {p}.\n"
+        assert captured.err == ""
+
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+        with pytest.raises(CommandError) as excinfo:
+            command.handle(**options)
+        assert excinfo.value.returncode == 1
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_compressed(self, capsys, tmp_path):
+        """--file reads compressed hostfiles, but won't edit them."""
+
+        p = tmp_path / "hosts.gz"
+        p.write_bytes(gzip.compress(b"127.0.0.1\tlocalhost\n"))
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), write=True)
+        command.handle(**options)
+        assert capsys.readouterr().out == "127.0.0.1\tlocalhost\n127.0.0.1\ttestproject.localhost\n"
+
+        for flag in ('in_place', 'low_memory'):
+            options = CMD_DEFAULTS.copy()
+            options.update(file=str(p), **{flag: True})
+            with pytest.raises(CommandError) as excinfo:
+                command.handle(**options)
+            assert excinfo.value.returncode == 2
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_write_undecodable(self, capsysbinary, tmp_path):
+        """--write gives back bytes which aren't UTF-8 as they were."""
+
+        data = "# café\n127.0.0.1\tlocalhost\n".encode('latin-1')
+        p = tmp_path / "hosts"
+        p.write_bytes(data)
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), write=True)
+        command.handle(**options)
+        assert capsysbinary.readouterr().out == data + b"127.0.0.1\ttestproject.localhost\n"
+
+        # a stream with no bytes underneath gets the text as read
+        out = StringIO()
+        Command(stdout=out).handle(**options)
+        assert out.getvalue() == "# caf\udce9\n127.0.0.1\tlocalhost\n127.0.0.1\ttestproject.localhost\n"
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_low_memory_write(self, tmp_path):
+        """--write can't work from the membership index."""
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(tmp_path / "hosts"), write=True, low_memory=True)
+        with pytest.raises(CommandError) as excinfo:
+            command.handle(**options)
+        assert excinfo.value.returncode == 2
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_watch(self, capsys, tmp_path, monkeypatch):
+        """--watch prints changed mappings and flags this project going missing."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	testproject.localhost\n", encoding="utf-8")
+        edits = [
+            None,   # nothing actually changed
+            "127.0.0.1	testproject.localhost\n127.0.0.1	a.localhost\n",
+            "127.0.0.1	a.localhost\n",
+            OSError,
+            "127.0.0.1	a.localhost testproject.localhost\n",
+        ]
+
+        def fake_changes(path):
+            assert path == p
+            for edit in edits:
+                if edit is OSError:
+                    p.unlink()
+                elif edit is not None:
+                    p.write_text(edit, encoding="utf-8")
+                yield
+        monkeypatch.setattr('runserveronhostname.management.commands.hostfile.changes', fake_changes)
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), watch=True, no_cache=True)
+        command.handle(**options)
+
+        captured = capsys.readouterr()
+        assert captured.out.splitlines() == [
+            f"Watching {p} (testproject.localhost is in it). Press Ctrl-C to stop.",
+            "+ 127.0.0.1\ta.localhost",
+            "- 127.0.0.1\ttestproject.localhost",
+            "+ 127.0.0.1\ttestproject.localhost",
+            f"testproject.localhost is back in {p}.",
+        ]
+        assert captured.err == f"Warning: testproject.localhost is no longer in {p}.\n"
+
+        def interrupted(path):
+            raise KeyboardInterrupt
+            yield
+        monkeypatch.setattr('runserveronhostname.management.commands.hostfile.changes', interrupted)
+        command.handle(**options)
+        assert capsys.readouterr().out == f"Watching {p} (testproject.localhost is in it). Press Ctrl-C to stop.\n"
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_timings(self, capsys, tmp_path):
+        """--timings reports on stderr, even when the command fails."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), status=True, timings=True)
+        with pytest.raises(CommandError):
+            command.handle(**options)
+
+        err = capsys.readouterr().err.splitlines()
+        assert err[0] == "Timings:"
+        assert "  cache     miss" in err
+        assert any(line.startswith("  parsed    1 lines") for line in err)
+        assert err[-1].startswith("  memory    ")
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_in_place(self, capsys, tmp_path):
+        """--in-place appends this project's line to the hostfile once."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), in_place=True)
+        command.handle(**options)
+        command.handle(**options)
+
+        assert p.read_text(encoding="utf-8") == "127.0.0.1	localhost\n127.0.0.1	testproject.localhost\n"
+        captured = capsys.readouterr()
+        assert captured.out.splitlines() == [
+            f"Added testproject.localhost to {p}.",
+            f"testproject.localhost is already in {p}.",
+        ]
+
+    @pytest.mark.parametrize('runserver_on', ['0.0.0.0:8000', '[::1]:8000', '8000'])
+    @pytest.mark.parametrize('flag', ['in_place', 'write', 'status'])
+    def test_without_hostname(self, capsys, tmp_path, runserver_on, flag):
+        """A RUNSERVER_ON with no hostname has nothing to add or look for."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), **{flag: True})
+        with override_settings(RUNSERVER_ON=runserver_on):
+            command.handle(**options)
+
+        assert p.read_text(encoding="utf-8") == "127.0.0.1	localhost\n"
+        assert capsys.readouterr().out == f"RUNSERVER_ON ({runserver_on}) has no hostname to look for in the hostfile.\n"
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_in_place_failure(self, tmp_path, monkeypatch):
+        """Failing to write the hostfile is a command error."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+
+        def fail(*args):
+            raise PermissionError("nope")
+        monkeypatch.setattr('runserveronhostname.management.commands.hostfile.append_entry', fail)
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), in_place=True)
+        with pytest.raises(CommandError) as excinfo:
+            command.handle(**options)
+        assert excinfo.value.returncode == 2
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_conflict_warning(self, capsys, tmp_path):
+        """Warn when other hostnames share a subtree with this project's."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost api.testproject.localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p))
+        command.handle(**options)
+        # names under this one are only looked for when asked
+        assert "share cookies" not in capsys.readouterr().err
+
+        options.update(conflicts=True)
+        command.handle(**options)
+        assert "can share cookies with api.testproject.localhost" in capsys.readouterr().err
+
+        # whatever case the hostfile spells it in
+        p.write_text("127.0.0.1	localhost API.TestProject.localhost\n", encoding="utf-8")
+        command.handle(**options)
+        assert "can share cookies with API.TestProject.localhost" in capsys.readouterr().err
+
+    @override_settings(RUNSERVER_ON='api.testproject.localhost:8000')
+    def test_parent_warning(self, capsys, tmp_path):
+        """Parent domains are always warned about."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	testproject.localhost api.testproject.localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), no_cache=True)
+        command.handle(**options)
+
+        assert "can share cookies with testproject.localhost" in capsys.readouterr().err
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_warnings_stay_lazy(self, capsys, tmp_path):
+        """Without the cache, the warnings don't parse past this project's line."""
+
+        p = tmp_path / "hosts"
+        p.write_text("# hosts\n10.0.0.1	testproject.localhost\n" + "0.0.0.0	blocked.example\n" * 1000, encoding="utf-8")
+
+        command = Command()
+        loaded = []
+        original = command._load
+
+        def load(*args):
+            loaded.append(original(*args))
+            return loaded[-1]
+        command._load = load
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), no_cache=True)
+        command.handle(**options)
+
+        assert "doesn't point at a loopback address" in capsys.readouterr().err
+        assert loaded[0]._pending is not None
+        assert loaded[0]._normal_hosts is None
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_loopback_warning(self, capsys, tmp_path):
+        """Warn when this project's hostname doesn't point at loopback."""
+
+        p = tmp_path / "hosts"
+        p.write_text("10.0.0.1	testproject.localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p))
+        command.handle(**options)
+
+        captured = capsys.readouterr()
+        assert "doesn't point at a loopback address" in captured.err
+        assert "10.0.0.1" in captured.err
+
+    @override_settings(RUNSERVER_ON='TestProject.localhost:8000')
+    @pytest.mark.parametrize('low_memory', [False, True])
+    def test_case_insensitive(self, capsys, tmp_path, low_memory):
+        """The project's hostname is found however the hostfile spells it."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	testproject.LOCALHOST\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), status=True, low_memory=low_memory)
+        command.handle(**options)
+
+        captured = capsys.readouterr()
+        assert captured.out == f"TestProject.localhost is already in {p}.\n"
+        # and is known to point at loopback
+        assert captured.err == ""
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_sync(self, capsys, tmp_path, isolated_registry):
+        """--sync registers this project and writes the managed block."""
+
+        isolated_registry.parent.mkdir(parents=True)
+        isolated_registry.write_text("other.localhost\n")
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), sync=True)
+        command.handle(**options)
+        command.handle(**options)
+
+        assert "127.0.0.1	other.localhost\n127.0.0.1	testproject.localhost\n" in p.read_text(encoding="utf-8")
+        assert capsys.readouterr().out.splitlines() == [
+            "Registered testproject.localhost.",
+            f"Updated the managed block in {p} (2 registered hostnames).",
+            f"{p} is already up to date.",
+        ]
+
+    def test_sync_without_setting(self, capsys, tmp_path):
+        """--sync without RUNSERVER_ON syncs whatever is registered."""
+
+        registry = tmp_path / "projects"
+        registry.write_text("other.localhost\n")
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), sync=True, registry=str(registry))
+        command.handle(**options)
+
+        assert "127.0.0.1	other.localhost" in p.read_text(encoding="utf-8")
+        assert registry.read_text() == "other.localhost\n"
+
+    @pytest.mark.parametrize('runserver_on', ['0.0.0.0:8000', '[::1]:8000'])
+    def test_sync_without_hostname(self, capsys, tmp_path, isolated_registry, runserver_on):
+        """--sync doesn't register a RUNSERVER_ON with no hostname in it."""
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(p), sync=True)
+        with override_settings(RUNSERVER_ON=runserver_on):
+            command.handle(**options)
+
+        assert not isolated_registry.exists()
+        assert p.read_text(encoding="utf-8") == "127.0.0.1	localhost\n"
+        assert capsys.readouterr().out == f"{p} is already up to date.\n"
+
+    @override_settings(RUNSERVER_ON='testproject.localhost:8000')
+    def test_sync_failure(self, tmp_path):
+        """A hostfile that can't be synced is a command error."""
+
+        command = Command()
+        options = CMD_DEFAULTS.copy()
+        options.update(file=str(tmp_path / "missing"), sync=True)
+        with pytest.raises(CommandError) as excinfo:
+            command.handle(**options)
+        assert excinfo.value.returncode == 2
@@ -1,9 +1,16 @@
 """
 Tests for hostfile parser.
 """
-from io import StringIO
+from array import array
+import bz2
+import gzip
+from io import BufferedReader, StringIO
+import lzma
+import marshal
+import os
+import tracemalloc
 import pytest
-from runserveronhostname.hostfile_parser import Hostfile
+from runserveronhostname.hostfile_parser import Hostfile, HostfileMembership, HostfileTimings, _BufferReader, _MappedLines, _parse_chunk
 
 
 class TestHostfileParser:
@@ -106,3 +113,971 @@ class TestHostfileParser:
 
         with pytest.raises(ValueError):
             format(hf, 'foobar')
+
+    def test_resolve_and_hosts_for(self):
+        "Check the forward and reverse indexes"
+        hosts = """# comment
+127.0.0.1	localhost
+127.0.0.1       test.localhost
+::1             localhost
+127.0.0.1	localhost
+"""
+        hf = Hostfile(hosts)
+
+        assert hf.resolve('localhost') == ['127.0.0.1', '::1']
+        assert hf.resolve('test.localhost') == ['127.0.0.1']
+        assert hf.resolve('quack.localhost') == []
+        assert hf.hosts_for('127.0.0.1') == ['localhost', 'test.localhost']
+        assert hf.hosts_for('::1') == ['localhost']
+        assert hf.hosts_for('10.0.0.1') == []
+        # lookups don't add keys
+        assert 'quack.localhost' not in hf
+        assert hf.ip_on_line(4) == '::1'
+
+    def test_lazy_hostfile(self):
+        "Lazy parsing stops early for membership and catches up for the rest"
+        hosts = """# comment
+127.0.0.1	localhost
+127.0.0.1	test.localhost
+::1	localhost
+"""
+        with StringIO(hosts) as f:
+            hf = Hostfile(f, lazy=True)
+
+            assert 'localhost' in hf
+            # only read as far as the first match
+            assert len(hf._contents) == 2
+            assert 'quack.localhost' not in hf
+            assert len(hf._contents) == 4
+            # a second miss doesn't re-read anything
+            assert 'quack.localhost' not in hf
+
+        assert hf['localhost'] == [2, 4]
+        assert len(hf) == 2
+        assert format(hf, 'raw') == hosts
+
+    def test_lazy_hostfile_full_load(self):
+        "Anything other than membership loads the whole file"
+        hosts = "127.0.0.1 localhost\n127.0.0.1 test.localhost\n"
+
+        hf = Hostfile(hosts, lazy=True)
+        assert list(hf) == ['localhost', 'test.localhost']
+
+        hf = Hostfile(hosts, lazy=True)
+        assert hf.ip_on_line(2) == '127.0.0.1'
+
+        hf = Hostfile(hosts, lazy=True)
+        assert hf.resolve('test.localhost') == ['127.0.0.1']
+
+        hf = Hostfile(hosts, lazy=True)
+        assert hf.hosts_for('127.0.0.1') == ['localhost', 'test.localhost']
+
+        hf = Hostfile(hosts, lazy=True)
+        assert repr(hf) == '<Hostfile: 2 lines, 1 unique IPs, 2 unique hosts>'
+
+    def test_from_path(self, tmp_path):
+        "Memory-mapped parsing matches parsing the text"
+        hosts = """# comment
+127.0.0.1	localhost
+127.0.0.1       test.localhost   café.localhost
+
+::1             localhost"""
+        p = tmp_path / "hosts"
+        p.write_text(hosts, encoding="utf-8")
+
+        hf = Hostfile.from_path(p)
+
+        assert list(hf) == ['localhost', 'test.localhost', 'café.localhost']
+        assert hf['localhost'] == [2, 5]
+        assert hf.ip_on_line(5) == '::1'
+        assert str(hf) == hosts
+        assert format(hf, 'clean') == format(Hostfile(hosts), 'clean')
+        assert hf._contents[-1] == '::1             localhost'
+        assert hf._contents[1:3] == hosts.splitlines(keepends=True)[1:3]
+        with pytest.raises(IndexError):
+            hf._contents[5]
+
+    def test_from_path_lazy(self, tmp_path):
+        "A lazy mapped Hostfile can be queried after the file is closed"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 localhost\n127.0.0.1 test.localhost\n", encoding="utf-8")
+
+        hf = Hostfile.from_path(p, lazy=True)
+
+        assert 'localhost' in hf
+        assert len(hf._contents) == 1
+        assert len(hf) == 2
+
+    def test_from_path_empty(self, tmp_path):
+        "Empty files can't be mapped but still parse"
+        p = tmp_path / "hosts"
+        p.write_text("", encoding="utf-8")
+
+        hf = Hostfile.from_path(p)
+
+        assert len(hf) == 0
+        assert str(hf) == ''
+
+    def test_repeated_hosts(self):
+        "Hosts on several lines keep every line and each IP once"
+        hosts = """127.0.0.1 localhost
+127.0.0.1 localhost
+::1 localhost
+10.0.0.1 localhost other
+"""
+        hf = Hostfile(hosts)
+
+        assert hf['localhost'] == [1, 2, 3, 4]
+        assert hf.resolve('localhost') == ['127.0.0.1', '::1', '10.0.0.1']
+        assert hf['other'] == [4]
+        assert hf.get('quack.localhost') is None
+        with pytest.raises(KeyError):
+            hf['quack.localhost']
+
+    def test_memory_per_host(self, tmp_path):
+        "Keep an eye on how much memory each host entry costs"
+        # a blocklist-style file: one IP repeated, mostly one host per line
+        count = 5_000
+        p = tmp_path / "hosts"
+        p.write_text(
+            ''.join(f"0.0.0.0 host{i}.blocked.example.com\n" for i in range(count)),
+            encoding="utf-8",
+        )
+
+        tracemalloc.start()
+        try:
+            hf = Hostfile.from_path(p)
+            used, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert len(hf) == count
+        # about 260 bytes today, most of which is the hostname itself
+        assert used / count < 320
+
+    def test_refresh_append(self, tmp_path, monkeypatch):
+        "Appending to the file only parses the new lines"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 localhost\n", encoding="utf-8")
+        hf = Hostfile.from_path(p, lazy=True)
+
+        assert hf.refresh() is False
+
+        with open(p, 'a', encoding="utf-8") as f:
+            f.write("127.0.0.1 test.localhost\n::1 localhost\n")
+        monkeypatch.setattr(Hostfile, '_map_and_parse', None)
+        assert hf.refresh() is True
+
+        assert list(hf) == ['localhost', 'test.localhost']
+        assert hf['localhost'] == [1, 3]
+        assert hf.ip_on_line(3) == '::1'
+        assert str(hf) == p.read_text(encoding="utf-8")
+        assert hf.refresh() is False
+
+    def test_refresh_touched(self, tmp_path):
+        "A new mtime with the same contents isn't a change"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 localhost\n", encoding="utf-8")
+        hf = Hostfile.from_path(p)
+
+        st = p.stat()
+        os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+        assert hf.refresh() is False
+        assert hf['localhost'] == [1]
+
+    def test_refresh_rewrite(self, tmp_path):
+        "Any change other than an append reparses the file"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 localhost\n127.0.0.1 old.localhost\n", encoding="utf-8")
+        hf = Hostfile.from_path(p)
+
+        p.write_text("127.0.0.1 localhost\n127.0.0.1 newer.localhost\n", encoding="utf-8")
+        assert hf.refresh() is True
+        assert list(hf) == ['localhost', 'newer.localhost']
+
+        # shrinking
+        p.write_text("127.0.0.1 localhost\n", encoding="utf-8")
+        assert hf.refresh() is True
+        assert list(hf) == ['localhost']
+
+        # extending an unterminated last line
+        p.write_text("127.0.0.1 localhost", encoding="utf-8")
+        assert hf.refresh() is True
+        p.write_text("127.0.0.1 localhost other.localhost\n", encoding="utf-8")
+        assert hf.refresh() is True
+        assert hf['other.localhost'] == [1]
+
+    @pytest.mark.parametrize('compress', [gzip.compress, bz2.compress, lzma.compress])
+    def test_compressed(self, tmp_path, compress):
+        "Compressed hostfiles are recognized and decompressed on the fly"
+        text = "# comment\r\n127.0.0.1 localhost a.localhost\n10.0.0.1\n::1 localhost"
+        p = tmp_path / "hosts.z"
+        p.write_bytes(compress(text.encode()))
+
+        for hf in (Hostfile.from_path(p), Hostfile.from_path(p, lazy=True)):
+            assert 'a.localhost' in hf
+            assert hf.resolve('localhost') == ['127.0.0.1', '::1']
+            assert str(hf) == text
+
+        with pytest.raises(ValueError):
+            Hostfile.from_path(p, workers=2)
+
+    def test_undecodable_bytes(self, tmp_path):
+        "Bytes which aren't UTF-8 survive parsing and formatting, as read"
+        data = "# café\n127.0.0.1 localhost\n".encode('latin-1')
+        p = tmp_path / "hosts"
+        p.write_bytes(data)
+        z = tmp_path / "hosts.gz"
+        z.write_bytes(gzip.compress(data))
+
+        for hf in (Hostfile.from_path(p), Hostfile.from_path(z)):
+            assert 'localhost' in hf
+            assert str(hf).encode('utf-8', 'surrogateescape') == data
+            assert format(hf, 'raw') == str(hf)
+            assert list(hf.iter_format()) == ["# caf\udce9", "127.0.0.1\tlocalhost"]
+
+    def test_bare_cr_line_endings(self, tmp_path):
+        "Lines ending in a bare \\r are split as when read from an open file"
+        text = "127.0.0.1 a.localhost\r127.0.0.1 b.localhost\r\n# c\r::1 a.localhost"
+        p = tmp_path / "hosts"
+        p.write_bytes(text.encode())
+
+        with open(p, encoding="utf-8", newline='') as f:
+            expected = Hostfile(f)
+        hf = Hostfile.from_path(p, workers=2)
+        assert list(hf) == list(expected) == ['a.localhost', 'b.localhost']
+        assert hf['a.localhost'] == [1, 4]
+        assert str(hf) == text
+        with pytest.raises(ValueError):
+            HostfileMembership.from_path(p)
+
+        # \r\n alone is still mapped
+        p.write_bytes(b"127.0.0.1 a.localhost\r\n")
+        assert type(Hostfile.from_path(p)._contents) is _MappedLines
+
+    def test_compressed_not_kept(self, tmp_path):
+        "Only the lines formatting needs are kept from a compressed hostfile"
+        text = "# comment\n\n" + ''.join(f"0.0.0.0 host{i}.example\n" for i in range(1000)) + "0.0.0.0 last.example"
+        p = tmp_path / "hosts.gz"
+        p.write_bytes(gzip.compress(text.encode()))
+        hf = Hostfile.from_path(p)
+        lines = hf._contents
+
+        assert lines._kept == {0: "# comment\n", 1: "\n", 1002: "0.0.0.0 last.example"}
+        assert str(hf) == text
+        assert len(list(hf.iter_format())) == 1002
+        assert lines[2] == "0.0.0.0 host0.example\n"
+        assert lines[-1] == "0.0.0.0 last.example"
+        assert lines[1:3] == ["\n", "0.0.0.0 host0.example\n"]
+        with pytest.raises(IndexError):
+            lines[1003]
+
+        hf.remove('host0.example')
+        hf.add('127.0.0.1', 'localhost')
+        assert str(hf) == text.replace("0.0.0.0 host0.example\n", "") + "\n127.0.0.1\tlocalhost\n"
+
+        p.write_bytes(gzip.compress(b""))
+        assert len(Hostfile.from_path(p)._contents) == 0
+
+    def test_buffer_reader(self):
+        "Readers over one buffer read it independently, as any binary file would"
+        buf = b"0123456789"
+        first, second = _BufferReader(buf), BufferedReader(_BufferReader(buf))
+        assert first.read(4) == b"0123"
+        assert second.read() == buf
+        assert first.read() == b"456789"
+        assert first.read() == b""
+
+    def test_compressed_refresh(self, tmp_path):
+        "A compressed hostfile is reparsed whenever it changes"
+        p = tmp_path / "hosts.gz"
+        p.write_bytes(gzip.compress(b"127.0.0.1 localhost\n"))
+        hf = Hostfile.from_path(p)
+        assert hf.refresh() is False
+
+        p.write_bytes(gzip.compress(b"127.0.0.1 localhost\n127.0.0.1 new.localhost\n"))
+        assert hf.refresh() is True
+        assert list(hf) == ['localhost', 'new.localhost']
+
+    def test_inline_comments(self, tmp_path):
+        "Words after a # aren't hostnames, and clean output keeps the comment"
+        text = """# comment
+127.0.0.1 localhost a.localhost  # not.a.host
+::1 localhost#also.not
+10.0.0.1 b.localhost #
+"""
+        p = tmp_path / "hosts"
+        p.write_text(text, encoding="utf-8")
+
+        for hf in (Hostfile(text), Hostfile(StringIO(text), lazy=True), Hostfile.from_path(p)):
+            assert list(hf) == ['localhost', 'a.localhost', 'b.localhost']
+            assert 'not.a.host' not in hf
+            assert format(hf, 'clean') == (
+                "# comment\n"
+                "127.0.0.1\tlocalhost a.localhost\t# not.a.host\n"
+                "::1\tlocalhost\t# also.not\n"
+                "10.0.0.1\tb.localhost"
+            )
+            assert 'not.a.host' not in format(hf, 'simple')
+
+        # editing a line keeps its comment; dropping it drops the comment
+        hf.remove('a.localhost')
+        hf.remove('b.localhost')
+        assert str(hf).splitlines()[1:] == ["127.0.0.1\tlocalhost\t# not.a.host", "::1 localhost#also.not"]
+        assert hf._line_comments == {1: 'not.a.host', 2: 'also.not'}
+
+    @pytest.mark.parametrize('compress', [None, gzip.compress])
+    def test_ip_without_hosts(self, tmp_path, compress):
+        "An IP naming no hosts is kept as text, like a comment, but isn't an entry"
+        text = "127.0.0.1 # note\n10.0.0.1\n127.0.0.1 localhost\n"
+        p = tmp_path / "hosts.gz" if compress else tmp_path / "hosts"
+        p.write_bytes(compress(text.encode()) if compress else text.encode())
+
+        for hf in (Hostfile(text), Hostfile.from_path(p)):
+            assert list(hf) == ['localhost']
+            assert dict(hf._ip_hosts) == {'127.0.0.1': {'localhost': None}}
+            assert list(hf._ips) == ['127.0.0.1']
+            assert format(hf, 'clean') == "127.0.0.1 # note\n10.0.0.1\n127.0.0.1\tlocalhost"
+            assert format(hf, 'simple') == "# simplified to one line per IP\n127.0.0.1\tlocalhost"
+            assert str(hf) == text
+
+    def test_tokenize_blocks(self, tmp_path, monkeypatch):
+        "Lines are tokenized a block at a time, with exact byte offsets"
+        monkeypatch.setattr('runserveronhostname.hostfile_parser._TOKENIZE_BLOCK', 16)
+        text = "127.0.0.1 ünïcode.localhost\r\n\n# çomment\n10.0.0.1 a.localhost b.localhost # x\n::1 last.localhost"
+        p = tmp_path / "hosts"
+        p.write_bytes(text.encode())
+
+        hf = Hostfile.from_path(p)
+        assert list(hf) == ['ünïcode.localhost', 'a.localhost', 'b.localhost', 'last.localhost']
+        assert hf['last.localhost'] == [5]
+        assert str(hf) == text
+        assert format(hf, 'raw') == format(Hostfile(text), 'raw')
+
+    def test_refresh_changes(self, tmp_path):
+        "Report the mappings a refresh added and removed"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 localhost a.localhost\n", encoding="utf-8")
+        hf = Hostfile.from_path(p, lazy=True)
+        assert hf.refresh_changes() is None
+
+        # appended: only the new lines are looked at
+        with open(p, 'a', encoding="utf-8") as f:
+            f.write("# comment\n127.0.0.1 a.localhost b.localhost b.localhost\n::1 localhost\n")
+        assert hf.refresh_changes() == ([('b.localhost', '127.0.0.1'), ('localhost', '::1')], [])
+
+        # rewritten: the old and new indexes are compared
+        p.write_text("127.0.0.1 localhost\n10.0.0.1 a.localhost\n", encoding="utf-8")
+        assert hf.refresh_changes() == (
+            [('a.localhost', '10.0.0.1')],
+            [('a.localhost', '127.0.0.1'), ('b.localhost', '127.0.0.1'), ('localhost', '::1')],
+        )
+
+    def test_refresh_needs_path(self):
+        "Only file-backed Hostfiles can be refreshed"
+        hf = Hostfile("127.0.0.1 localhost\n")
+
+        with pytest.raises(ValueError):
+            hf.refresh()
+
+    def test_batch_membership(self):
+        "Check several hosts in one go"
+        hosts = """127.0.0.1 localhost
+127.0.0.1 a.localhost
+127.0.0.1 b.localhost
+"""
+        with StringIO(hosts) as f:
+            hf = Hostfile(f, lazy=True)
+
+            results = hf.contains_many(['a.localhost', 'x.localhost', 'localhost'])
+            assert next(results) == ('a.localhost', True)
+            # answered without reading the rest
+            assert len(hf._contents) == 2
+            assert list(results) == [('x.localhost', False), ('localhost', True)]
+
+        assert hf.missing(['b.localhost', 'y.localhost', 'z.localhost']) == ['y.localhost', 'z.localhost']
+        assert hf.missing([]) == []
+
+    def test_streaming_formats(self):
+        "iter_format and write_to produce the same output as format()"
+        raw_hosts = """# A comment
+
+127.0.0.1\ta.localhost   b.localhost
+::1 a.localhost
+127.0.0.1   c.localhost
+"""
+        hf = Hostfile(raw_hosts)
+
+        assert list(hf.iter_format('clean')) == [
+            "# A comment",
+            "127.0.0.1\ta.localhost b.localhost",
+            "::1\ta.localhost",
+            "127.0.0.1\tc.localhost",
+        ]
+        assert list(hf.iter_format('simple'))[1:] == [
+            "127.0.0.1\ta.localhost b.localhost c.localhost",
+            "::1\ta.localhost",
+        ]
+        for spec in ('clean', 'simple'):
+            assert '\n'.join(hf.iter_format(spec)) == format(hf, spec)
+
+            with StringIO() as out:
+                hf.write_to(out, spec)
+                assert out.getvalue() == format(hf, spec) + '\n'
+
+        with StringIO() as out:
+            hf.write_to(out, 'raw')
+            assert out.getvalue() == raw_hosts
+
+        with pytest.raises(ValueError):
+            hf.iter_format('foobar')
+
+    def test_under_and_conflicts(self):
+        "Wildcard-style queries over the hostname trie"
+        hosts = """127.0.0.1 localhost
+127.0.0.1 app.localhost
+127.0.0.1 api.app.localhost v2.api.app.localhost
+127.0.0.1 other.localhost
+10.0.0.1 db.dev.internal
+"""
+        hf = Hostfile(hosts)
+
+        assert sorted(hf.under('localhost')) == [
+            'api.app.localhost', 'app.localhost', 'other.localhost', 'v2.api.app.localhost',
+        ]
+        assert sorted(hf.under('*.app.localhost')) == ['api.app.localhost', 'v2.api.app.localhost']
+        assert hf.under('dev.internal') == ['db.dev.internal']
+        assert hf.under('internal') == ['db.dev.internal']
+        assert hf.under('quack.localhost') == []
+        assert hf.under('example.com') == []
+
+        assert sorted(hf.conflicts('api.app.localhost')) == ['app.localhost', 'v2.api.app.localhost']
+        assert sorted(hf.conflicts('app.localhost')) == ['api.app.localhost', 'v2.api.app.localhost']
+        # localhost itself never counts
+        assert hf.conflicts('other.localhost') == []
+        assert hf.conflicts('new.other.localhost') == ['other.localhost']
+        assert hf.conflicts('a.b.c.example.com') == []
+
+    def test_trie_ignores_case(self):
+        "The trie matches names ignoring case and IDNA encoding, like lookups"
+        hf = Hostfile("127.0.0.1 API.MyApp.localhost api.myapp.localhost\n127.0.0.1 shop.Bücher.example\n")
+
+        assert hf.conflicts('x.myapp.localhost') == []
+        assert hf.conflicts('myapp.localhost') == ['API.MyApp.localhost']
+        assert hf.under('MYAPP.localhost') == ['API.MyApp.localhost']
+        assert hf.under('xn--bcher-kva.example') == ['shop.Bücher.example']
+        assert hf.conflicts('MyApp.LOCALHOST') == ['API.MyApp.localhost']
+
+        # every spelling goes at once, from a node they share
+        hf.remove('api.myapp.localhost')
+        assert hf.under('localhost') == []
+        hf.add('127.0.0.1', 'a.b.localhost', 'A.b.localhost')
+        hf.remove('a.B.localhost')
+        assert hf.under('localhost') == []
+        hf.add('127.0.0.1', 'b.localhost', 'B.localhost', 'a.b.localhost')
+        hf.remove('b.localhost')
+        assert hf.under('localhost') == ['a.b.localhost']
+
+    def test_parents_lazy(self, tmp_path):
+        "parents() only parses as far as the names it finds"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 app.localhost\n" + "0.0.0.0 blocked.example\n" * 1000, encoding="utf-8")
+        hf = Hostfile.from_path(p, lazy=True)
+
+        assert hf.parents('api.app.localhost') == ['app.localhost']
+        assert hf._pending is not None
+        assert hf._trie is None
+
+    def test_resolve_parsed_only(self, tmp_path):
+        "resolve(parsed_only=True) answers from what's parsed, for a host spelt as given"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 app.localhost\n0.0.0.0 blocked.example\n::1 App.localhost app.localhost\n", encoding="utf-8")
+        hf = Hostfile.from_path(p, lazy=True)
+
+        assert 'app.localhost' in hf
+        assert hf.resolve('app.localhost', parsed_only=True) == ['127.0.0.1']
+        assert hf.is_loopback('app.localhost', parsed_only=True)
+        assert hf._pending is not None and hf._normal_hosts is None
+        # other spellings, or a host not seen yet, mean parsing the rest
+        assert hf.resolve('APP.localhost', parsed_only=True) == ['127.0.0.1', '::1']
+        assert hf.resolve('app.localhost') == ['127.0.0.1', '::1']
+
+    def test_trie_follows_refresh(self, tmp_path):
+        "Hosts added by refresh() show up in an already-built trie"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 app.localhost\n", encoding="utf-8")
+        hf = Hostfile.from_path(p)
+        assert hf.under('localhost') == ['app.localhost']
+
+        with open(p, 'a', encoding="utf-8") as f:
+            f.write("127.0.0.1 api.app.localhost app.localhost\n")
+        hf.refresh()
+
+        assert sorted(hf.under('localhost')) == ['api.app.localhost', 'app.localhost']
+
+    def test_case_and_idna(self):
+        "Hostnames match ignoring case and IDNA encoding"
+        hosts = """127.0.0.1 MyApp.localhost
+::1 myapp.localhost MYAPP.LOCALHOST
+10.0.0.1 bücher.example
+10.0.0.2 XN--BCHER-KVA.example api.localhost
+10.0.0.3 bad..idna.é
+"""
+        hf = Hostfile(hosts)
+
+        for host in ['myapp.localhost', 'MyApp.localhost', 'myApp.LocalHost']:
+            assert host in hf
+            assert hf[host] == [1, 2]
+            assert hf.resolve(host) == ['127.0.0.1', '::1']
+        assert hf['bücher.example'] == [3, 4]
+        assert hf['xn--bcher-kva.example'] == [3, 4]
+        assert hf.resolve('BÜCHER.example') == ['10.0.0.1', '10.0.0.2']
+        # a single spelling, found without the normalized index
+        assert hf['api.localhost'] == [4]
+        assert hf.resolve('API.localhost') == ['10.0.0.2']
+        # names the IDNA codec rejects are still matched by case
+        assert hf['BAD..IDNA.É'] == [5]
+        assert 'other.localhost' not in hf
+        assert 42 not in hf
+        with pytest.raises(KeyError):
+            hf['Other.localhost']
+        assert hf.resolve('Other.localhost') == []
+        # iteration keeps the spellings in the file
+        assert 'MYAPP.LOCALHOST' in list(hf)
+
+    def test_normalized_index_follows_edits(self, tmp_path):
+        "The normalized index keeps up with add(), remove() and refresh()"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 App.localhost\n", encoding="utf-8")
+        hf = Hostfile.from_path(p)
+        assert 'app.localhost' in hf
+
+        with open(p, 'a', encoding="utf-8") as f:
+            f.write("::1 APP.localhost Api.localhost\n")
+        hf.refresh()
+        assert hf.resolve('app.localhost') == ['127.0.0.1', '::1']
+        assert 'api.localhost' in hf
+
+        hf.add('10.0.0.1', 'aPP.localhost', 'db.localhost')
+        assert hf['app.localhost'] == [1, 2, 3]
+        # every spelling goes at once
+        hf.remove('APP.localhost')
+        assert 'app.localhost' not in hf
+        assert hf._normal_hosts == {'api.localhost': 'Api.localhost'}
+        hf.remove('Api.localhost')
+        hf.remove('db.localhost')
+        assert 'api.localhost' not in hf
+
+    def test_ip_queries(self):
+        "Query hosts by address family and network"
+        hosts = """127.0.0.1 localhost
+127.000.000.001 padded.localhost
+::ffff:127.0.0.1 mapped.localhost
+::1 localhost six.localhost
+10.1.2.3 db.internal
+fe80::1%lo0 link.local
+0.0.0.0 blocked.example.com
+not-an-ip broken.example.com
+999.000.0.1 broken.example.com
+"""
+        hf = Hostfile(hosts)
+
+        assert hf.loopback_hosts() == ['localhost', 'padded.localhost', 'mapped.localhost', 'six.localhost']
+        assert hf.by_network('10.0.0.0/8') == ['db.internal']
+        assert hf.by_network('10.1.2.3') == ['db.internal']
+        assert hf.by_network('192.168.0.0/16') == []
+        assert hf.by_network('fe80::/10') == ['link.local']
+        assert hf.ipv4() == [
+            'blocked.example.com', 'db.internal', 'localhost', 'padded.localhost', 'mapped.localhost',
+        ]
+        assert hf.ipv6() == ['localhost', 'six.localhost', 'link.local']
+
+        assert hf.is_loopback('padded.localhost')
+        assert hf.is_loopback('localhost')
+        assert not hf.is_loopback('db.internal')
+        assert not hf.is_loopback('broken.example.com')
+        assert not hf.is_loopback('quack.localhost')
+
+    def test_ip_index_follows_refresh(self, tmp_path):
+        "IPs added by refresh() show up in an already-built IP index"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 localhost\n", encoding="utf-8")
+        hf = Hostfile.from_path(p)
+        assert hf.by_network('10.0.0.0/8') == []
+
+        with open(p, 'a', encoding="utf-8") as f:
+            f.write("10.0.0.5 db.internal\n127.0.0.1 app.localhost\n")
+        hf.refresh()
+
+        assert hf.by_network('10.0.0.0/8') == ['db.internal']
+        assert hf.loopback_hosts() == ['localhost', 'app.localhost']
+
+    def test_parallel_parse(self, tmp_path):
+        "Parsing in chunks across worker processes matches a single parse"
+        lines = ["# header\n", "127.0.0.1 localhost\n", "\n"]
+        for i in range(300):
+            lines.append(f"0.0.0.0 host{i}.example.com\n")
+            if i % 50 == 0:
+                lines.append(f"::1 localhost host{i}.example.com shared.localhost\n")
+        p = tmp_path / "hosts"
+        p.write_text(''.join(lines) + "127.0.0.1 last.localhost", encoding="utf-8")
+
+        expected = Hostfile.from_path(p)
+        hf = Hostfile.from_path(p, workers=4)
+
+        assert list(hf) == list(expected)
+        for host in ('localhost', 'host0.example.com', 'host150.example.com', 'shared.localhost', 'last.localhost'):
+            assert hf[host] == expected[host]
+            assert hf.resolve(host) == expected.resolve(host)
+        assert hf.hosts_for('::1') == expected.hosts_for('::1')
+        assert [hf.ip_on_line(n) for n in range(1, len(lines) + 2)] == \
+            [expected.ip_on_line(n) for n in range(1, len(lines) + 2)]
+        assert str(hf) == str(expected)
+        assert format(hf, 'simple') == format(expected, 'simple')
+        assert hf._digest == expected._digest
+
+    def test_parallel_parse_small(self, tmp_path):
+        "More workers than lines, or an empty file, still works"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 localhost\n", encoding="utf-8")
+        assert list(Hostfile.from_path(p, workers=4)) == ['localhost']
+
+        p.write_text("", encoding="utf-8")
+        assert list(Hostfile.from_path(p, workers=4)) == []
+
+        with pytest.raises(ValueError):
+            Hostfile.from_path(p, lazy=True, workers=2)
+
+    def test_parse_chunk(self, tmp_path):
+        "The worker function numbers lines from where its chunk starts"
+        text = "127.0.0.1 a.localhost\n127.0.0.1 b.localhost b.localhost\n::1 a.localhost # v6\n"
+        p = tmp_path / "hosts"
+        p.write_text(text, encoding="utf-8")
+        start = text.index('127.0.0.1 b')
+
+        state = marshal.loads(_parse_chunk(p, start, len(text), 2))
+        _, line_ips, _, line_comments, ips, hosts, records, _, _, normal_hosts = state
+
+        assert line_ips == ['127.0.0.1', '::1']
+        assert line_comments == {2: 'v6'}
+        assert array('I', ips['::1']).tolist() == [3]
+        assert hosts['a.localhost'] == 3
+        assert records == ['b.localhost']
+        assert array('I', hosts['b.localhost'][0]).tolist() == [2, 2]
+        # built on demand, not by workers
+        assert normal_hosts is None
+
+    def test_add(self):
+        "Added lines are indexed and formatted without reparsing"
+        hf = Hostfile("# comment\n127.0.0.1 localhost")
+        hf.under('localhost')
+        hf.by_network('10.0.0.0/8')
+
+        hf.add('10.0.0.1', 'db.localhost', 'cache.localhost')
+        hf.add('127.0.0.1', 'localhost')
+
+        assert hf['db.localhost'] == [3]
+        assert hf['localhost'] == [2, 4]
+        assert hf.ip_on_line(3) == '10.0.0.1'
+        assert sorted(hf.under('localhost')) == ['cache.localhost', 'db.localhost']
+        assert hf.by_network('10.0.0.0/8') == ['db.localhost', 'cache.localhost']
+        assert str(hf) == "# comment\n127.0.0.1 localhost\n10.0.0.1\tdb.localhost cache.localhost\n127.0.0.1\tlocalhost\n"
+        assert format(hf, 'simple').endswith("127.0.0.1\tlocalhost localhost\n10.0.0.1\tdb.localhost cache.localhost")
+
+        for bad in [('127.0.0.1',), ('127.0.0.1', '#comment'), ('127.0.0.1', 'a#b'), ('127.0.0.1', 'two words'), ('', 'a.localhost')]:
+            with pytest.raises(ValueError):
+                hf.add(*bad)
+
+    def test_remove(self):
+        "Removing a host updates every index it was in"
+        hosts = """127.0.0.1 localhost a.localhost
+10.0.0.1 b.localhost
+::1 a.localhost
+"""
+        hf = Hostfile(hosts)
+        hf.under('localhost')
+        hf.by_network('10.0.0.0/8')
+
+        hf.remove('a.localhost')
+
+        assert 'a.localhost' not in hf
+        assert hf.resolve('a.localhost') == []
+        assert hf.hosts_for('::1') == []
+        assert hf.hosts_for('127.0.0.1') == ['localhost']
+        assert hf.ip_on_line(3) is None
+        assert hf.ipv6() == []
+        assert hf.under('localhost') == ['b.localhost']
+        assert str(hf) == "127.0.0.1\tlocalhost\n10.0.0.1 b.localhost\n"
+        assert list(hf.iter_format('clean')) == ["127.0.0.1\tlocalhost", "10.0.0.1\tb.localhost"]
+
+        hf.remove('b.localhost')
+        assert hf.by_network('10.0.0.0/8') == []
+        assert hf.under('localhost') == []
+        assert len(hf) == 1
+
+        with pytest.raises(KeyError):
+            hf.remove('quack.localhost')
+
+    def test_remove_emptied_lines(self, tmp_path):
+        "Lines emptied by remove() are left out wherever an IP's lines are used"
+        p = tmp_path / "hosts"
+        p.write_text("0.0.0.0 a.example\n0.0.0.0 b.example\n0.0.0.0 c.example\n127.0.0.1 localhost\n", encoding="utf-8")
+        hf = Hostfile.from_path(p)
+
+        hf.remove('b.example')
+        assert format(hf, 'simple').splitlines()[1:] == ["0.0.0.0\ta.example c.example", "127.0.0.1\tlocalhost"]
+        assert array('I', hf._get_state()[4]['0.0.0.0']).tolist() == [1, 3]
+
+        hf.add('0.0.0.0', 'd.example')
+        hf.remove('a.example')
+        hf.remove('c.example')
+        assert format(hf, 'simple').splitlines()[1:] == ["0.0.0.0\td.example", "127.0.0.1\tlocalhost"]
+        hf.remove('d.example')
+        assert hf.by_network('0.0.0.0/32') == []
+        assert repr(hf) == "<Hostfile: 5 lines, 1 unique IPs, 1 unique hosts>"
+
+    def test_remove_keeps_trie_branches(self):
+        "Removing a host leaves its parents and siblings in the trie"
+        hf = Hostfile("127.0.0.1 app.localhost api.app.localhost v2.api.app.localhost\n127.0.0.1 db.dev.internal\n")
+        hf.under('localhost')
+
+        hf.remove('api.app.localhost')
+        hf.remove('db.dev.internal')
+
+        assert sorted(hf.under('localhost')) == ['app.localhost', 'v2.api.app.localhost']
+        assert hf.under('internal') == []
+        assert 'internal' not in hf._trie
+        assert hf.hosts_for('127.0.0.1') == ['app.localhost', 'v2.api.app.localhost']
+
+    def test_set(self):
+        "set() leaves exactly one mapping for a host"
+        hf = Hostfile("127.0.0.1 localhost a.localhost\n::1 a.localhost\n")
+
+        hf.set('a.localhost', '10.0.0.1')
+        assert hf.resolve('a.localhost') == ['10.0.0.1']
+        assert hf['a.localhost'] == [3]
+
+        hf.set('a.localhost', '10.0.0.1')
+        assert len(hf._contents) == 3
+
+        hf.set('b.localhost', '127.0.0.1')
+        assert hf.resolve('b.localhost') == ['127.0.0.1']
+        assert list(hf.iter_format('clean')) == [
+            "127.0.0.1\tlocalhost", "10.0.0.1\ta.localhost", "127.0.0.1\tb.localhost",
+        ]
+
+    @pytest.mark.parametrize('compress', [None, gzip.compress])
+    @pytest.mark.parametrize('text, expected', [
+        ("127.0.0.1 localhost\n127.0.0.1 a\n", "127.0.0.1 localhost\n10.0.0.1\ta\n"),
+        ("127.0.0.1 localhost\n127.0.0.1 a", "127.0.0.1 localhost\n10.0.0.1\ta\n"),
+        ("127.0.0.1 localhost\r127.0.0.1 a\r", "127.0.0.1 localhost\r10.0.0.1\ta\n"),
+    ])
+    def test_set_last_line(self, tmp_path, compress, text, expected):
+        "Replacing the last line leaves no blank line behind, however the file was read"
+        p = tmp_path / "hosts"
+        p.write_bytes(compress(text.encode()) if compress else text.encode())
+        for hf in (Hostfile(text), Hostfile.from_path(p)):
+            hf.set('a', '10.0.0.1')
+            assert str(hf) == expected
+
+    def test_edit_any_spelling(self):
+        "remove() and set() act on every spelling of a host, as lookups do"
+        hf = Hostfile("127.0.0.1 myapp.localhost\n::1 MyApp.localhost other.localhost\n")
+
+        hf.set('MYAPP.localhost', '10.0.0.1')
+        assert hf.resolve('myapp.localhost') == ['10.0.0.1']
+        assert list(hf) == ['other.localhost', 'MYAPP.localhost']
+        assert list(hf.iter_format('clean')) == ["::1\tother.localhost", "10.0.0.1\tMYAPP.localhost"]
+
+        hf.remove('myapp.LOCALHOST')
+        assert 'MYAPP.localhost' not in hf
+        assert hf.hosts_for('10.0.0.1') == []
+        with pytest.raises(KeyError):
+            hf.remove('MyApp.localhost')
+
+    def test_edit_mapped(self, tmp_path):
+        "A Hostfile from a path can be edited too, and refresh() drops the edits"
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 localhost a.localhost\n", encoding="utf-8")
+        hf = Hostfile.from_path(p, lazy=True)
+
+        hf.add('127.0.0.1', 'b.localhost')
+        hf.remove('a.localhost')
+        assert str(hf) == "127.0.0.1\tlocalhost\n127.0.0.1\tb.localhost\n"
+        assert hf._contents[-1] == "127.0.0.1\tb.localhost\n"
+        with pytest.raises(IndexError):
+            hf._contents[2] = ''
+
+        # unchanged on disk: the edits stay
+        assert hf.refresh() is False
+        assert 'b.localhost' in hf
+
+        with open(p, 'a', encoding="utf-8") as f:
+            f.write("127.0.0.1 c.localhost\n")
+        assert hf.refresh() is True
+        assert list(hf) == ['localhost', 'a.localhost', 'c.localhost']
+
+
+class TestHostfileMembership:
+    """Test the membership-only index."""
+
+    def test_membership(self, tmp_path):
+        """Membership matches Hostfile's, without false positives."""
+        text = """# 127.0.0.1 commented.localhost
+127.0.0.1	localhost a.localhost
+::1	localhost
+
+10.0.0.1
+0.0.0.0 ünïcode.example"""
+        p = tmp_path / "hosts"
+        p.write_text(text, encoding="utf-8")
+        hm = HostfileMembership.from_path(p)
+        hf = Hostfile.from_path(p)
+
+        for host in ['localhost', 'a.localhost', 'ünïcode.example', 'commented.localhost',
+                     '127.0.0.1', '10.0.0.1', 'localhos', 'b.localhost', '#']:
+            assert (host in hm) == (host in hf), host
+        assert 42 not in hm
+        assert hm.missing(['a.localhost', 'b.localhost']) == ['b.localhost']
+        assert len(hm) == 4
+        assert repr(hm) == "<HostfileMembership: 4 hostname entries>"
+
+    def test_inline_comments(self):
+        """Words in inline comments aren't hostnames."""
+        hm = HostfileMembership(b"127.0.0.1 a.localhost # b.localhost\n::1 c.localhost#d.localhost")
+        assert hm.missing(['a.localhost', 'b.localhost', 'c.localhost', 'd.localhost']) == ['b.localhost', 'd.localhost']
+
+    def test_case_and_idna(self):
+        """Hostnames match ignoring case and IDNA encoding, like Hostfile's."""
+        hm = HostfileMembership("127.0.0.1 MyApp.localhost bücher.example\n".encode())
+        assert hm.missing(['myapp.localhost', 'MYAPP.localhost', 'xn--bcher-kva.example', 'Bücher.example', 'app.localhost']) == ['app.localhost']
+
+    def test_empty(self, tmp_path):
+        """An empty file has no hosts."""
+        p = tmp_path / "hosts"
+        p.write_bytes(b"")
+        assert 'localhost' not in HostfileMembership.from_path(p)
+
+    def test_collisions(self, monkeypatch):
+        """Every candidate line with a matching hash is checked."""
+        monkeypatch.setattr(HostfileMembership, '_HASH_MASK', 0)
+        hm = HostfileMembership(b"127.0.0.1 a\n127.0.0.1 b\n127.0.0.1 c\n")
+
+        assert all(host in hm for host in 'abc')
+        assert 'd' not in hm
+
+    def test_merged_runs(self, monkeypatch):
+        """Keys sorted in separate runs are merged in order."""
+        monkeypatch.setattr(HostfileMembership, '_RUN_LENGTH', 3)
+        buf = ''.join(f"0.0.0.0 host{i}.example h{i}\n" for i in range(50)).encode()
+        hm = HostfileMembership(buf)
+
+        assert list(hm._keys) == sorted(hm._keys)
+        assert all(f"host{i}.example" in hm and f"h{i}" in hm for i in range(50))
+        assert 'host50.example' not in hm
+
+    def test_compressed(self, tmp_path):
+        """Offsets into a compressed file are no use, so it's refused."""
+        p = tmp_path / "hosts.gz"
+        p.write_bytes(gzip.compress(b"127.0.0.1 localhost\n"))
+        with pytest.raises(ValueError):
+            HostfileMembership.from_path(p)
+
+    def test_too_large(self, monkeypatch):
+        """Files past what an offset can address are refused."""
+        monkeypatch.setattr(HostfileMembership, '_OFFSET_BITS', 4)
+        with pytest.raises(ValueError):
+            HostfileMembership(b"127.0.0.1 localhost\n")
+
+    def test_memory_per_host(self, tmp_path):
+        "Each hostname costs one 64-bit key"
+        count = 5_000
+        p = tmp_path / "hosts"
+        p.write_text(
+            ''.join(f"0.0.0.0 host{i}.blocked.example.com\n" for i in range(count)),
+            encoding="utf-8",
+        )
+
+        tracemalloc.start()
+        try:
+            hm = HostfileMembership.from_path(p)
+            used, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert len(hm) == count
+        assert used / count < 12
+
+
+class TestHostfileTimings:
+    """Test the timing and memory instrumentation."""
+
+    def test_phases(self, tmp_path):
+        """Parsing and formatting are timed phase by phase."""
+        p = tmp_path / "hosts"
+        p.write_text("# comment\n127.0.0.1 localhost\n::1 localhost\n", encoding="utf-8")
+        timings = HostfileTimings()
+
+        hf = Hostfile.from_path(p, lazy=True, timings=timings)
+        assert set(timings.phases) == {'read'}
+        assert 'localhost' in hf
+        assert set(timings.phases) == {'read', 'tokenize', 'index'}
+        assert timings.lines == 2
+        hf.write_to(StringIO(), 'simple')
+        format(hf, 'raw')
+        assert set(timings.phases) == {'read', 'tokenize', 'index', 'format'}
+        assert timings.lines == 3
+        assert timings.total == sum(timings.phases.values())
+        assert timings.lines_per_second > 0
+
+    def test_compressed_and_parallel(self, tmp_path):
+        """Decompressing counts as reading, and worker processes as parsing."""
+        p = tmp_path / "hosts.gz"
+        p.write_bytes(gzip.compress(b"127.0.0.1 localhost\n"))
+        timings = HostfileTimings()
+        Hostfile.from_path(p, timings=timings)
+        assert set(timings.phases) == {'read', 'index'}
+        assert timings.lines == 1
+
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1 localhost\n" * 10, encoding="utf-8")
+        timings = HostfileTimings()
+        Hostfile.from_path(p, workers=2, timings=timings)
+        assert set(timings.phases) == {'read', 'parse'}
+        assert timings.lines == 10
+
+    def test_tracking_memory(self):
+        """Peak memory is traced, starting tracemalloc only if needed."""
+        timings = HostfileTimings()
+        with timings.tracking_memory():
+            Hostfile("127.0.0.1 localhost\n" * 1000)
+        assert timings.peak_memory > 0
+        assert not tracemalloc.is_tracing()
+
+        tracemalloc.start()
+        try:
+            with timings.tracking_memory():
+                pass
+            assert tracemalloc.is_tracing()
+        finally:
+            tracemalloc.stop()
+
+    def test_report(self):
+        """The report lists what was measured, in phase order."""
+        timings = HostfileTimings()
+        assert timings.lines_per_second is None
+        assert timings.report() == ["total          0.000 ms"]
+
+        timings.phases = {'index': 0.003, 'read': 0.001}
+        timings.lines = 3000
+        timings.cache = 'miss'
+        timings.peak_memory = 2048
+        assert timings.report() == [
+            "read           1.000 ms",
+            "index          3.000 ms",
+            "total          4.000 ms",
+            "cache     miss",
+            "parsed    3,000 lines, 1,000,000 lines/s",
+            "memory    2.0 KiB peak (tracemalloc)",
+        ]
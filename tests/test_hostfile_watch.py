@@ -0,0 +1,90 @@
+"""
+Tests for noticing hostfile changes.
+"""
+import sys
+import threading
+import pytest
+from runserveronhostname import hostfile_watch
+from runserveronhostname.hostfile_watch import changes
+
+
+def later(fn, delay=0.05):
+    timer = threading.Timer(delay, fn)
+    timer.start()
+    return timer
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="inotify is Linux-only")
+class TestInotify:
+    """Test waiting for changes with inotify."""
+
+    def test_change(self, tmp_path):
+        """Writes to the file wake the watcher, writes to its neighbours don't."""
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+        watcher = changes(p)
+
+        writing = threading.Event()
+
+        def write():
+            writing.set()
+            p.write_text("127.0.0.1	a.localhost\n", encoding="utf-8")
+        later(lambda: (tmp_path / "other").write_text("noise"), 0.05)
+        later(write, 0.3)
+        next(watcher)
+        # the watcher can wake before the timer's thread finishes
+        assert writing.is_set()
+        watcher.close()
+
+    def test_replaced(self, tmp_path):
+        """Replacing the file by renaming over it is noticed."""
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+        watcher = changes(p)
+
+        def replace():
+            tmp = tmp_path / "hosts.new"
+            tmp.write_text("127.0.0.1	a.localhost\n", encoding="utf-8")
+            tmp.replace(p)
+        later(replace)
+        next(watcher)
+        watcher.close()
+
+    def test_unavailable(self, tmp_path, monkeypatch):
+        """Anything that stops inotify from being set up means polling."""
+        assert hostfile_watch._inotify(tmp_path / "missing" / "hosts") is None
+
+        class NoInotify:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            def inotify_init1(self, flags):
+                return -1
+        monkeypatch.setattr('ctypes.CDLL', NoInotify)
+        assert hostfile_watch._inotify(tmp_path / "hosts") is None
+
+        def missing(*args, **kwargs):
+            raise OSError("no libc")
+        monkeypatch.setattr('ctypes.CDLL', missing)
+        assert hostfile_watch._inotify(tmp_path / "hosts") is None
+
+        monkeypatch.setattr('sys.platform', 'darwin')
+        assert hostfile_watch._inotify(tmp_path / "hosts") is None
+
+
+class TestPolling:
+    """Test the polling fallback."""
+
+    def test_poll(self, tmp_path, monkeypatch):
+        """Changes to the file's stat are reported, including its removal."""
+        monkeypatch.setattr(hostfile_watch, '_inotify', lambda path: None)
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+        watcher = changes(p, interval=0.01)
+
+        later(lambda: p.write_text("127.0.0.1	localhost a.localhost\n", encoding="utf-8"))
+        next(watcher)
+        later(p.unlink)
+        next(watcher)
+        assert not p.exists()
+        watcher.close()
@@ -0,0 +1,183 @@
+"""
+Tests for hostfile writing helpers.
+"""
+import gzip
+import stat
+import pytest
+from runserveronhostname.hostfile_writer import (
+    BLOCK_BEGIN, BLOCK_END, append_entry, sync_managed_block, write_atomic,
+)
+
+
+class TestAppendEntry:
+    """Test appending a line to a hostfile."""
+
+    def test_append(self, tmp_path):
+        """A line is added after the existing contents."""
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+
+        append_entry(p, '127.0.0.1', 'a.localhost', 'b.localhost')
+
+        assert p.read_text(encoding="utf-8") == "127.0.0.1	localhost\n127.0.0.1	a.localhost b.localhost\n"
+
+    def test_append_unterminated(self, tmp_path):
+        """A missing final newline is added first."""
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost", encoding="utf-8")
+
+        append_entry(p, '::1', 'a.localhost')
+
+        assert p.read_text(encoding="utf-8") == "127.0.0.1	localhost\n::1	a.localhost\n"
+
+    def test_append_empty(self, tmp_path):
+        """Appending to an empty file just writes the line."""
+        p = tmp_path / "hosts"
+        p.write_text("", encoding="utf-8")
+
+        append_entry(p, '127.0.0.1', 'a.localhost')
+
+        assert p.read_text(encoding="utf-8") == "127.0.0.1	a.localhost\n"
+
+    def test_append_invalid(self, tmp_path):
+        """Entries which wouldn't read back as written are refused, leaving the file alone."""
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+
+        for bad in [('127.0.0.1',), ('127.0.0.1', 'a#b'), ('127.0.0.1', 'two words'), ('', 'a.localhost')]:
+            with pytest.raises(ValueError):
+                append_entry(p, *bad)
+        assert p.read_text(encoding="utf-8") == "127.0.0.1	localhost\n"
+
+
+class TestManagedBlock:
+    """Test syncing the managed block of a hostfile."""
+
+    def test_create_update_remove(self, tmp_path):
+        """The block is added, rewritten and removed as the names change."""
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost", encoding="utf-8")
+
+        assert sync_managed_block(p, ['b.localhost', 'a.localhost', 'localhost']) is True
+        assert p.read_text(encoding="utf-8") == (
+            "127.0.0.1	localhost\n"
+            f"{BLOCK_BEGIN}\n"
+            "127.0.0.1	a.localhost\n"
+            "127.0.0.1	b.localhost\n"
+            f"{BLOCK_END}\n"
+        )
+
+        p.write_text(p.read_text(encoding="utf-8") + "::1	localhost\n", encoding="utf-8")
+        assert sync_managed_block(p, ['c.localhost']) is True
+        assert p.read_text(encoding="utf-8") == (
+            "127.0.0.1	localhost\n"
+            f"{BLOCK_BEGIN}\n"
+            "127.0.0.1	c.localhost\n"
+            f"{BLOCK_END}\n"
+            "::1	localhost\n"
+        )
+
+        assert sync_managed_block(p, []) is True
+        assert p.read_text(encoding="utf-8") == "127.0.0.1	localhost\n::1	localhost\n"
+
+    def test_no_op(self, tmp_path, monkeypatch):
+        """Nothing is written when the block is already right."""
+        p = tmp_path / "hosts"
+        p.write_text("127.0.0.1	localhost\n", encoding="utf-8")
+        assert sync_managed_block(p, []) is False
+        sync_managed_block(p, ['a.localhost'])
+
+        def fail(*args):
+            raise AssertionError("should not have written")
+        monkeypatch.setattr('runserveronhostname.hostfile_writer.write_atomic', fail)
+
+        assert sync_managed_block(p, ['a.localhost']) is False
+        assert sync_managed_block(p, ['a.localhost', 'localhost']) is False
+
+    def test_unterminated_block(self, tmp_path):
+        """A block with no end marker isn't guessed at."""
+        p = tmp_path / "hosts"
+        p.write_text(f"{BLOCK_BEGIN}\n127.0.0.1	a.localhost\n", encoding="utf-8")
+
+        with pytest.raises(ValueError):
+            sync_managed_block(p, ['b.localhost'])
+
+
+class TestWriteAtomic:
+    """Test atomically replacing a file."""
+
+    def test_replace(self, tmp_path):
+        """The contents are replaced and the permissions kept."""
+        p = tmp_path / "hosts"
+        p.write_text("old\n", encoding="utf-8")
+        p.chmod(0o640)
+
+        write_atomic(p, b"new\n")
+
+        assert p.read_bytes() == b"new\n"
+        assert stat.S_IMODE(p.stat().st_mode) == 0o640
+        assert [f.name for f in tmp_path.iterdir()] == ['hosts']
+
+    def test_symlink(self, tmp_path):
+        """A symlinked file is replaced where it really lives, keeping the link."""
+        target = tmp_path / "store" / "hosts"
+        target.parent.mkdir()
+        target.write_text("old\n", encoding="utf-8")
+        link = tmp_path / "hosts"
+        link.symlink_to(target)
+
+        write_atomic(link, b"new\n")
+
+        assert link.is_symlink()
+        assert target.read_bytes() == b"new\n"
+        assert sorted(f.name for f in target.parent.iterdir()) == ['hosts']
+
+    def test_cleanup_on_failure(self, tmp_path, monkeypatch):
+        """A failed replace leaves the original alone and no temp file behind."""
+        p = tmp_path / "hosts"
+        p.write_text("old\n", encoding="utf-8")
+
+        def fail(*args):
+            raise OSError("nope")
+        monkeypatch.setattr('os.replace', fail)
+
+        with pytest.raises(OSError):
+            write_atomic(p, b"new\n")
+        assert p.read_bytes() == b"old\n"
+        assert [f.name for f in tmp_path.iterdir()] == ['hosts']
+
+    def test_chown_not_permitted(self, tmp_path, monkeypatch):
+        """Not being allowed to keep the owner isn't fatal."""
+        p = tmp_path / "hosts"
+        p.write_text("old\n", encoding="utf-8")
+
+        def fail(*args):
+            raise PermissionError("nope")
+        monkeypatch.setattr('os.chown', fail)
+
+        write_atomic(p, b"new\n")
+        assert p.read_bytes() == b"new\n"
+
+    def test_no_chown(self, tmp_path, monkeypatch):
+        """Platforms without chown just skip it."""
+        p = tmp_path / "hosts"
+        p.write_text("old\n", encoding="utf-8")
+        monkeypatch.delattr('os.chown')
+
+        write_atomic(p, b"new\n")
+        assert p.read_bytes() == b"new\n"
+
+
+class TestCompressed:
+    """Compressed hostfiles aren't edited as if they were text."""
+
+    def test_refused(self, tmp_path):
+        p = tmp_path / "hosts.gz"
+        original = gzip.compress(b"127.0.0.1\tlocalhost\n")
+        p.write_bytes(original)
+
+        with pytest.raises(ValueError):
+            append_entry(p, '127.0.0.1', 'a.localhost')
+        with pytest.raises(ValueError):
+            sync_managed_block(p, ['a.localhost'])
+        assert p.read_bytes() == original
@@ -1,10 +1,15 @@
 """
 Tests for PartialRunserverCommand class.
 """
+import os
+import socket
 import pytest
 from django.test import override_settings
-from django.core.management.base import BaseCommand
-from runserveronhostname.management.commands._runserver import PartialRunserverCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.commands.runserver import Command as RunserverCommand
+from runserveronhostname import checks
+from runserveronhostname.management.commands import _runserver
+from runserveronhostname.management.commands._runserver import RESOLVED_ENV, PartialRunserverCommand
 
 
 @pytest.mark.django_db
@@ -163,4 +168,117 @@ class TestPartialRunserverCommand:
                 
                 assert captured['addrport'] == runserver_value, \
                     f"Failed for {runserver_value}"
-    
\ No newline at end of file
+    
+
+@pytest.fixture
+def runserver(monkeypatch, tmp_path):
+    """A composed runserver command which records whether it would have started serving."""
+    p = tmp_path / "hosts"
+    p.write_text("127.0.0.1	preflight.localhost\n", encoding="utf-8")
+    monkeypatch.setattr(checks, 'SYSTEM_HOSTFILE', str(p))
+    monkeypatch.setattr('sys.platform', 'linux')
+    monkeypatch.delenv(RESOLVED_ENV, raising=False)
+
+    started = []
+
+    class TestCommand(PartialRunserverCommand, RunserverCommand):
+        def inner_run(self, *args, **options):
+            started.append((self.addr, self.port))
+
+    def run(addrport='', use_ipv6=False):
+        TestCommand().handle(addrport=addrport, use_ipv6=use_ipv6, use_reloader=False)
+        return started
+    return run
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestPreflight:
+    """Test checking RUNSERVER_ON before runserver does anything slow."""
+
+    def test_hostfile(self, runserver):
+        """A hostname is resolved from the hostfile, and the answer kept for reloads."""
+        port = free_port()
+        with override_settings(RUNSERVER_ON=f'preflight.localhost:{port}'):
+            assert runserver() == [('preflight.localhost', str(port))]
+        assert os.environ[RESOLVED_ENV] == 'preflight.localhost 4 127.0.0.1'
+
+    def test_cached(self, runserver, monkeypatch):
+        """Reloaded processes reuse the first one's answer."""
+        monkeypatch.setenv(RESOLVED_ENV, 'elsewhere.localhost 4 127.0.0.1')
+
+        def fail(host, version):
+            raise AssertionError("should have used the cached address")
+        monkeypatch.setattr(_runserver, '_from_hostfile', fail)
+        with override_settings(RUNSERVER_ON=f'elsewhere.localhost:{free_port()}'):
+            assert len(runserver()) == 1
+
+    def test_address_family(self, runserver, tmp_path):
+        """Only addresses runserver would bind to count, whichever comes first."""
+        (tmp_path / "hosts").write_text("::1	dual.localhost\n127.0.0.1	dual.localhost\n", encoding="utf-8")
+        with socket.socket(socket.AF_INET6) as sock:
+            # the IPv6 address is taken, but runserver won't use it
+            sock.bind(('::1', 0))
+            sock.listen()
+            port = sock.getsockname()[1]
+            with override_settings(RUNSERVER_ON=f'dual.localhost:{port}'):
+                assert runserver() == [('dual.localhost', str(port))]
+            assert os.environ[RESOLVED_ENV] == 'dual.localhost 4 127.0.0.1'
+
+            # ...unless it's told to
+            with override_settings(RUNSERVER_ON=f'dual.localhost:{port}'):
+                with pytest.raises(CommandError, match=f"Can't listen on ::1 port {port}"):
+                    runserver(use_ipv6=True)
+            assert os.environ[RESOLVED_ENV] == 'dual.localhost 6 ::1'
+
+    def test_dns(self, runserver, monkeypatch):
+        """Hostnames missing from the hostfile are looked up in DNS."""
+        looked_up = []
+
+        def getaddrinfo(host, port, **kwargs):
+            assert kwargs['family'] == socket.AF_INET
+            looked_up.append(host)
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 0))]
+        monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+        with override_settings(RUNSERVER_ON=f'dns.example:{free_port()}'):
+            assert len(runserver()) == 1
+        assert looked_up == ['dns.example']
+
+        # and where there's no hostfile to read
+        monkeypatch.delenv(RESOLVED_ENV)
+        monkeypatch.setattr(checks, 'SYSTEM_HOSTFILE', '/nonexistent/hosts')
+        with override_settings(RUNSERVER_ON=f'dns.example:{free_port()}'):
+            assert len(runserver()) == 2
+        monkeypatch.delenv(RESOLVED_ENV)
+        monkeypatch.setattr('sys.platform', 'win32')
+        with override_settings(RUNSERVER_ON=f'dns.example:{free_port()}'):
+            assert len(runserver()) == 3
+        assert looked_up == ['dns.example'] * 3
+
+    def test_unresolvable(self, runserver, monkeypatch):
+        """A hostname which doesn't resolve fails before the server starts."""
+        def getaddrinfo(host, port, **kwargs):
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+        with override_settings(RUNSERVER_ON='missing.localhost:8000'):
+            with pytest.raises(CommandError, match="missing.localhost doesn't resolve"):
+                runserver()
+        assert RESOLVED_ENV not in os.environ
+
+    def test_port_taken(self, runserver):
+        """A port already in use fails before the server starts."""
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            sock.listen()
+            port = sock.getsockname()[1]
+            with override_settings(RUNSERVER_ON=f'127.0.0.1:{port}'):
+                with pytest.raises(CommandError, match=f"Can't listen on 127.0.0.1 port {port}"):
+                    runserver()
+
+            # an explicit addrport is left to runserver itself
+            with override_settings(RUNSERVER_ON=f'127.0.0.1:{port}'):
+                assert runserver(f'127.0.0.1:{port}') == [('127.0.0.1', str(port))]
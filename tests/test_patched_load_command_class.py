@@ -163,3 +163,46 @@ class TestPatchedLoadCommandClass:
             # Verify it's patched correctly
             assert isinstance(result, PartialRunserverCommand)
             assert isinstance(result, MockDaphneRunserverCommand)
+
+    def test_composed_class_is_reused(self):
+        """Test that each app's runserver Command class is only composed once."""
+        with patch('runserveronhostname.apps.import_module') as mock_import:
+            mock_module = MagicMock()
+
+            class MockRunserverCommand(BaseCommand):
+                pass
+
+            mock_module.Command = MockRunserverCommand
+            mock_import.return_value = mock_module
+
+            first = patched_load_command_class('django.core', 'runserver')
+            second = patched_load_command_class('django.core', 'runserver')
+            # a fresh instance each time, of the same class
+            assert first is not second
+            assert type(first) is type(second)
+
+            # another app gets its own class
+            other = patched_load_command_class('daphne', 'runserver')
+            assert type(other) is not type(first)
+
+    def test_reloaded_module_recomposes(self):
+        """Test that a reloaded module's new Command class replaces the cached one."""
+        with patch('runserveronhostname.apps.import_module') as mock_import:
+            mock_module = MagicMock()
+
+            class MockRunserverCommand(BaseCommand):
+                pass
+
+            mock_module.Command = MockRunserverCommand
+            mock_import.return_value = mock_module
+            before = patched_load_command_class('django.core', 'runserver')
+
+            class ReloadedRunserverCommand(BaseCommand):
+                pass
+
+            mock_module.Command = ReloadedRunserverCommand
+            after = patched_load_command_class('django.core', 'runserver')
+
+            assert isinstance(after, ReloadedRunserverCommand)
+            assert not isinstance(after, MockRunserverCommand)
+            assert type(before) is not type(after)
@@ -0,0 +1,33 @@
+"""
+Tests for the project hostname registry.
+"""
+from runserveronhostname.registry import read_registry, register, registry_path
+
+
+class TestRegistry:
+    """Test the registry of project hostnames."""
+
+    def test_registry_path(self, isolated_registry, monkeypatch):
+        """The registry honors XDG_CONFIG_HOME and falls back to ~/.config."""
+        assert registry_path() == isolated_registry
+
+        monkeypatch.delenv('XDG_CONFIG_HOME')
+        assert registry_path().parent.parent.name == '.config'
+
+    def test_register(self, isolated_registry):
+        """Hostnames are added once each, in order."""
+        assert read_registry() == []
+
+        assert register('b.localhost') is True
+        assert register('a.localhost') is True
+        assert register('b.localhost') is False
+
+        assert read_registry() == ['b.localhost', 'a.localhost']
+        assert isolated_registry.read_text() == "b.localhost\na.localhost\n"
+
+    def test_hand_edited(self, tmp_path):
+        """Comments, blank lines and duplicates are ignored."""
+        p = tmp_path / "projects"
+        p.write_text("# my projects\n\n  a.localhost \nb.localhost\na.localhost\n")
+
+        assert read_registry(p) == ['a.localhost', 'b.localhost']